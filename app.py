@@ -1,126 +1,320 @@
 import asyncio
 import discord
-import asyncpg
-from datetime import datetime
+from datetime import datetime, timedelta
 from discord import app_commands
 from discord.ext import commands, tasks
 from discord.ui import Modal, Button, View, TextInput
 from discord import ButtonStyle
 from typing import Optional
 import os
-from tz_convert import local_to_utc, utc_to_local, time_format_locale, date_format, find_timezone, convert_locale, local_to_utc_date, validate_time_input
-import timedelta
+import time
+import tempfile
+from functools import partial
+from tz_convert import utc_to_local, time_format_locale, date_format, validate_time_input, converter
 from dotenv import load_dotenv
 import pytz
+from scheduler import ReminderScheduler
+from change_feed import ChangeFeed
+from cache import LRUCache, UserCache
+from role_index import RoleIndex, role_name
+from guild_settings import GuildSettings
+from profiles import TimezoneProfiles
+from event_cache import EventCache
+from event_index import EventIndex
+from outbox import OutboxWorker, PermanentError
+from migrations import migrate
+from repository import Repository, create_pool
+from startup import StartupTimer, sync_commands
+from importer import ImportFormatError, load_events, MAX_IMPORT_BYTES, MAX_NAME_LENGTH
+from exporter import CalendarFeed, SPOOL_BYTES, spool_ics
+from sharding import Partition, PartitionLocks
+from pagination import KeysetPager
+from recurrence import RULES, describe as describe_recurrence, overlapping
+from slots import free_windows, search_range
+from delivery import Delivery, DeliveryEngine, dm_bucket, channel_bucket, pack_lines, MESSAGE_LIMIT
 
 load_dotenv()
 intents = discord.Intents.all()
-reminder_status = asyncio.Event()
 # intents.message_content = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+partition = Partition.from_env()
+if partition.sharded:
+    # each process runs a slice of the shards and owns the reminders/cleanup for those guilds
+    bot = commands.AutoShardedBot(command_prefix='!', intents=intents,
+                                  shard_count=partition.shard_count, shard_ids=partition.shard_ids)
+else:
+    bot = commands.Bot(command_prefix='!', intents=intents)
+bot.partition = partition
+# created up front so role events that arrive before on_ready are not lost
+bot.role_index = RoleIndex()
+bot.guild_settings = GuildSettings()
+
+
+# Runs once per process, before the gateway connects. Everything here survives reconnects.
+async def setup_hook():
+    timer = bot.startup_timer = StartupTimer()
+    db_config = dict(
+        host=os.getenv("HOST"),
+        database=os.getenv("DATABASE"),
+        user=os.getenv("USER_NAME"),
+        password=os.getenv("PASSWORD")
+    )
+    with timer.phase("pool"):
+        bot.pool = await create_pool(**db_config)
+        bot.db = Repository(bot.pool)
+    with timer.phase("migrations"):
+        async with bot.pool.acquire() as conn:
+            await migrate(conn)
+        await bot.guild_settings.load(bot.db)
+    with timer.phase("command sync"):
+        # verifies # of commands that are functional on Discord
+        synced = await sync_commands(bot.tree, bot.application_id)
+        print("Command tree unchanged, skipped sync" if synced is None else f"Synced {synced} command(s)")
+    with timer.phase("workers"):
+        bot.reminders = ReminderScheduler(bot.pool, send_reminders, bot.partition)
+        bot.partition_locks = PartitionLocks(bot.partition, db_config, on_acquired=bot.reminders.reload)
+        await bot.partition_locks.acquire()
+        bot.outbox = OutboxWorker(bot.pool, {
+            'assign_role': assign_event_role,
+            'remove_role': remove_event_role,
+            'delete_role': delete_event_role,
+        }, bot.partition)
+        bot.delivery = DeliveryEngine()
+        bot.user_cache = UserCache(bot)
+        bot.profiles = TimezoneProfiles(bot.db)
+        bot.event_cache = EventCache(bot.db)
+        bot.event_index = EventIndex(bot.db)
+        bot.change_feed = ChangeFeed(db_config)
+        bot.change_feed.subscribe(bot.reminders.apply, bot.reminders.reload)
+        # writes from other processes reach the event cache through the feed
+        bot.change_feed.subscribe(bot.event_cache.on_change, bot.event_cache.clear)
+        bot.change_feed.subscribe(bot.event_index.on_change, bot.event_index.clear)
+        await bot.change_feed.start()
+        # reminder delivery waits for the gateway itself
+        bot.reminders.start()
+        cleanup.start()
+        log_stats.start()
+        bot.calendar_feed = CalendarFeed.from_env(bot.db)
+        if bot.calendar_feed:
+            await bot.calendar_feed.start()
+
 
+bot.setup_hook = setup_hook
 
+
+# Fires again after every gateway reconnect, only the first one finishes startup
 @bot.event
 async def on_ready():
     print(f'We have logged in as {bot.user}')
-    # verifies # of commands that are functional on Discord
+    if getattr(bot, 'started', False):
+        return
+    bot.started = True
     try:
-        bot.pool = await asyncpg.create_pool(
-            host=os.getenv("HOST"),
-            database=os.getenv("DATABASE"),
-            user=os.getenv("USER_NAME"),
-            password=os.getenv("PASSWORD")
-        )
-        synced = await bot.tree.sync()
-        reminder.start()
-        cleanup.start()
-        print(f"Synced {len(synced)} command(s)")
+        # needs the guild cache, which is only complete once the gateway is ready
+        with bot.startup_timer.phase("role index"):
+            await build_role_index_with_retry()
+    finally:
+        # role messages would pile up without a worker, so it starts even if the index didn't build
+        bot.outbox.start()
+        bot.startup_timer.report()
 
-    except Exception as e:
-        print("Error ", e)
 
+# Attempts to build the role index, backing off between failures such as a DB blip
+ROLE_INDEX_ATTEMPTS = 5
+
+
+async def build_role_index_with_retry():
+    for attempt in range(1, ROLE_INDEX_ATTEMPTS + 1):
+        try:
+            await build_role_index()
+            return
+        except Exception as e:
+            print(f"Error building the role index (attempt {attempt}/{ROLE_INDEX_ATTEMPTS}): {e}")
+            if attempt < ROLE_INDEX_ATTEMPTS:
+                await asyncio.sleep(2 ** attempt)
 
-@tasks.loop(minutes=1)
-async def reminder():
-    await bot.wait_until_ready()
-    current_time = datetime.utcnow()
-
-    async with bot.pool.acquire() as conn:
-        events = await conn.fetch(
-            """
-            SELECT s.uiud, s.eid, e.meetingname, e.timestart, e.timeend, e.gid, s.notification
-            FROM scheduled s
-            INNER JOIN event e ON s.eid = e.eid
-            WHERE e.timestart <= $1
-            AND s.notification = 0
-            """,
-            current_time
-        )
 
-        for event in events:
-            if not event['gid']:
-                user = await bot.fetch_user(event['uiud'])
-                if user:
-                    await user.send(f"'{event['meetingname']}' is starting soon!")
+async def build_role_index():
+    stored = await bot.db.fetch('role_links')
+    found = bot.role_index.build(bot.guilds, stored)
+    if found:
+        # roles created before role_id was stored are linked by name once, then by id
+        await bot.db.executemany('link_role_by_name', found)
+
+
+@bot.event
+async def on_guild_role_create(role):
+    bot.role_index.on_role_create(role)
+
+
+@bot.event
+async def on_guild_role_update(before, after):
+    bot.role_index.on_role_update(before, after)
+
+
+@bot.event
+async def on_guild_role_delete(role):
+    bot.role_index.on_role_delete(role)
+
+
+@bot.event
+async def on_guild_channel_create(channel):
+    bot.guild_settings.invalidate(channel.guild.id)
+
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    bot.guild_settings.invalidate(after.guild.id)
 
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    bot.guild_settings.invalidate(channel.guild.id)
+
+
+@bot.event
+async def on_guild_update(before, after):
+    # the system channel may have changed
+    bot.guild_settings.invalidate(after.id)
+
+
+@bot.event
+async def on_guild_remove(guild):
+    # after a kick the guild's "Event N" roles are still there for a rejoin, so their index
+    # entries are kept; RoleIndex.get returns None for any that are deleted in the meantime.
+    # The configured reminder channel stays too, only the resolved channel object is dropped.
+    bot.guild_settings.invalidate(guild.id)
+
+
+# Wraps a Discord send so the delivery engine knows whether the reminder was handled
+async def deliver(eid, send):
+    try:
+        await send()
+    except (discord.Forbidden, discord.NotFound) as e:
+        # retrying won't help, so treat it as handled
+        print(f"Could not deliver reminder for event {eid}: {e}")
+    except discord.HTTPException as e:
+        # left claimed, the claim expires and the reminder is retried
+        print(f"Failed to send reminder for event {eid}: {e}")
+        return False
+    return True
+
+
+def reminder_channel(gid):
+    server = bot.get_guild(gid)
+    if not server:
+        return None
+    return bot.guild_settings.reminder_channel(server)
+
+
+# Groups due rows so each DM recipient and each guild channel gets one message per tick,
+# with one line per event instead of one message per scheduled row
+def reminder_deliveries(events):
+    dms = {}
+    channels = {}
+    undeliverable = []
+    for event in events:
+        if not event['gid']:
+            dms.setdefault(event['uiud'], {}).setdefault(event['eid'], []).append(event)
+            continue
+
+        channel = reminder_channel(event['gid'])
+        if channel:
+            channels.setdefault(channel.id, (channel, {}))[1].setdefault(event['eid'], []).append(event)
+        else:
+            undeliverable.append(event)
+
+    deliveries = []
+    for uiud, by_event in dms.items():
+        lines = [(f"'{rows[0]['meetingname']}' is starting soon!", rows) for rows in by_event.values()]
+        for content, rows in pack_lines(lines):
+            async def send_dm(uiud=uiud, content=content):
+                try:
+                    await bot.user_cache.send(uiud, content)
+                except discord.NotFound:
+                    bot.user_cache.discard(uiud)
+                    raise
+
+            deliveries.append(Delivery(dm_bucket(uiud), lambda send=send_dm, eid=rows[0]['eid']: deliver(eid, send), rows))
+
+    for channel, by_event in channels.values():
+        lines = []
+        for eid, rows in by_event.items():
+            role = bot.role_index.get(channel.guild, eid)
+            if role:
+                lines.append((f"{role.mention} Your event '{rows[0]['meetingname']}' is starting soon!", rows))
             else:
-                server = bot.get_guild(event['gid'])
-                if server:
-                    role = discord.utils.get(
-                        server.roles, name=f"Event {event['eid']}")
-                    if role:
-                        # this just picks either the system or first available text channel, so idk what yall want
-                        channel = server.system_channel or next(
-                            (x for x in server.text_channels), None)
-                        if channel:
-                            await channel.send(f"{role.mention} Your event '{event['meetingname']}' is starting soon!")
-                    else:
-                        channel = server.system_channel or next(
-                            (x for x in server.text_channels), None)
-                        if channel:
-                            await channel.send(f"Your event '{event['meetingname']}' is starting soon!")
-
-            await conn.execute(
-                "UPDATE scheduled SET notification = 1 WHERE uiud = $1 AND eid = $2",
-                event['uiud'], event['eid']
-            )
-    reminder_status.set()
+                lines.append((f"Your event '{rows[0]['meetingname']}' is starting soon!", rows))
+        for content, rows in pack_lines(lines):
+            deliveries.append(Delivery(
+                channel_bucket(channel.id),
+                lambda send=partial(channel.send, content), eid=rows[0]['eid']: deliver(eid, send),
+                rows
+            ))
+
+    return deliveries, undeliverable
+
+
+# Called by the reminder scheduler with a batch of claimed rows, returns the ones that were handled
+async def send_reminders(events):
+    await bot.wait_until_ready()
+
+    # rows with nowhere to post are marked done, same as before
+    deliveries, sent = reminder_deliveries(events)
+    sent.extend(await bot.delivery.run(deliveries))
+    return sent
+
+
+# Ended events whose reminders still haven't gone out are kept this long before being dropped anyway
+CLEANUP_GRACE = timedelta(minutes=15)
 
 
 @tasks.loop(minutes=1)
 async def cleanup():
-    await reminder_status.wait()
-    current_time = datetime.utcnow()
-
-    async with bot.pool.acquire() as conn:
-        ended = await conn.fetch(
-            """
-            SELECT eid, meetingname, gid
-            FROM event
-            WHERE timeend <= $1
-            """,
-            current_time
-        )
+    try:
+        ended, advanced = await bot.db.delete_ended_events(datetime.utcnow(), CLEANUP_GRACE, bot.partition.sql_args())
+    except Exception as e:
+        # an exception would stop the loop for good, so just try again next tick
+        print(f"Error cleaning up ended events: {e}")
+        return
+
+    for event in ended + advanced:
+        bot.event_cache.invalidate_event(event['eid'], event['gid'])
+    for event in ended:
+        bot.event_index.remove_event(event['eid'])
+    if ended:
+        bot.outbox.wake()
+
+
+# Cache counters land in the log every STATS_LOG_MINUTES
+STATS_LOG_MINUTES = int(os.getenv("STATS_LOG_MINUTES", "15"))
+
 
-        for event in ended:
-            if event['gid']:
-                server = bot.get_guild(event['gid'])
-                if server:
-                    role_name = f"Event {event['eid']}"
-                    role = discord.utils.get(server.roles, name=role_name)
-                    if role:
-                        try:
-                            await role.delete(reason=f"Event {event['eid']} has ended.")
-                        except discord.Forbidden:
-                            print(
-                                f"The bot doesn't have permission to delete roles in this server, please contact your server admins!")
-                        except discord.HTTPException as e:
-                            print(
-                                f"Failed to delete role for event {event['eid']}: {e}")
-
-            await conn.execute("DELETE FROM scheduled WHERE eid = $1", event['eid'])
-            await conn.execute("DELETE FROM event WHERE eid = $1", event['eid'])
-    reminder_status.clear()
+@tasks.loop(minutes=STATS_LOG_MINUTES)
+async def log_stats():
+    print(f"event cache: {bot.event_cache.stats()}")
+    print(f"user cache: {bot.user_cache.stats()}")
+    # the ten queries with the most total time
+    for name, latency in list(bot.db.stats().items())[:10]:
+        print(f"query {name}: {latency['calls']} calls, avg {latency['avg_ms']:.1f} ms, max {latency['max_ms']:.1f} ms")
+
+
+def valid_date(text):
+    try:
+        datetime.strptime(text, '%Y-%m-%d')
+    except ValueError:
+        return False
+    return True
+
+
+# (rule, until, timezone) for create_event, the series runs through the whole of its last day
+def parse_recurrence(event_details, timezone):
+    repeat = event_details.get('repeat')
+    if not repeat:
+        return None, None, None
+    until = event_details.get('repeat_until')
+    if until:
+        until = converter.parse_local(until, "23:59:59", timezone)
+    return repeat, until, timezone
 
 
 class CreatePrivateView(discord.ui.View):
@@ -137,21 +331,15 @@ class CreatePrivateView(discord.ui.View):
         # Extract event details
         event_name = self.event_details['event_name']
         event_location = self.event_details['event_location']
-        event_start = f"{self.event_details['event_start_date']} {local_to_utc(self.event_details['event_start_time'])}"
-        event_end = f"{self.event_details['event_end_date']} {local_to_utc(self.event_details['event_end_time'])}"
         try:
-            event_start_cpy = event_start
-            event_end_cpy = event_end
-
-            event_start_utc = local_to_utc_date(event_start_cpy)
-            event_end_utc = local_to_utc_date(event_end_cpy)
-
-            event_start = datetime.strptime(
-                event_start, "%Y-%m-%d %H:%M:%S")
-            event_end = datetime.strptime(
-                event_end, "%Y-%m-%d %H:%M:%S")
-
-            # if not validate_time_input(event_start_utc, event_end_utc):
+            # typed in the creator's timezone, stored as naive UTC
+            event_start = converter.parse_local(
+                self.event_details['event_start_date'], self.event_details['event_start_time'], self.timezone)
+            event_end = converter.parse_local(
+                self.event_details['event_end_date'], self.event_details['event_end_time'], self.timezone)
+            recurrence = parse_recurrence(self.event_details, self.timezone)
+
+            # if not validate_time_input(event_start, event_end):
             #     raise ValueError(
             #         "Event start time is either past or after event end time")
 
@@ -160,27 +348,21 @@ class CreatePrivateView(discord.ui.View):
             self.future.set_result(True)
             return
 
-        async with bot.pool.acquire() as conn:
-            user = await conn.fetchrow("SELECT * FROM \"user\" WHERE uiud = $1", self.uiud)
-            if user is None:
-                await conn.execute("INSERT INTO \"user\" (uiud, name) VALUES ($1, $2)", self.uiud, self.user_name)
-
-            eid = await conn.fetchval(
-                "INSERT INTO event (uiud, meetingname, location, timestart, timeend) VALUES ($1, $2, $3, $4, $5) RETURNING eid",
-                self.uiud, event_name, event_location, event_start, event_end)
-
-            if eid:
-                await conn.execute(
-                    "INSERT INTO scheduled (uiud, eid, status, notification) VALUES ($1, $2, 'Yes', 0)",
-                    self.uiud, eid)
-                role_name = f"Event {eid}"
-                await notification_role(interaction.guild, interaction.user.id, role_name)
-                await interaction.response.send_message(
-                    f"{interaction.user.mention}, {event_name} at {event_location} has been scheduled for {date_format(self.event_details['event_start_date'])} to {date_format(self.event_details['event_end_date'])} from {convert_locale(local_to_utc(self.event_details['event_start_time']), self.timezone)} to {convert_locale(local_to_utc(self.event_details['event_end_time']), self.timezone)}.", ephemeral=True)
+        eid = await bot.db.create_event(self.uiud, self.user_name, None, event_name, event_location, event_start, event_end,
+                                        role_gid=interaction.guild_id, user_id=interaction.user.id,
+                                        recurrence=recurrence)
 
-            else:
-                await interaction.response.send_message(
-                    f"{interaction.user.mention}, there was an issue creating the event.", ephemeral=True)
+        if eid:
+            bot.event_index.add_event(eid, None, self.uiud, event_name)
+            bot.outbox.wake()
+            start_date, start_time, end_date, end_time = converter.convert_many(
+                [{'timestart': event_start, 'timeend': event_end}], self.timezone)[0]
+            await interaction.response.send_message(
+                f"{interaction.user.mention}, {event_name} at {event_location} has been scheduled for {start_date} to {end_date} from {start_time} to {end_time}.", ephemeral=True)
+
+        else:
+            await interaction.response.send_message(
+                f"{interaction.user.mention}, there was an issue creating the event.", ephemeral=True)
 
         self.future.set_result(True)
 
@@ -206,21 +388,15 @@ class CreateServerView(discord.ui.View):
         # Extract event details
         event_name = self.event_details['event_name']
         event_location = self.event_details['event_location']
-        event_start = f"{self.event_details['event_start_date']} {local_to_utc(self.event_details['event_start_time'])}"
-        event_end = f"{self.event_details['event_end_date']} {local_to_utc(self.event_details['event_end_time'])}"
         try:
-            event_start_cpy = event_start
-            event_end_cpy = event_end
-
-            event_start_utc = local_to_utc_date(event_start_cpy)
-            event_end_utc = local_to_utc_date(event_end_cpy)
-
-            event_start = datetime.strptime(
-                event_start, "%Y-%m-%d %H:%M:%S")
-            event_end = datetime.strptime(
-                event_end, "%Y-%m-%d %H:%M:%S")
-
-            # if not validate_time_input(event_start_utc, event_end_utc):
+            # typed in the creator's timezone, stored as naive UTC
+            event_start = converter.parse_local(
+                self.event_details['event_start_date'], self.event_details['event_start_time'], self.timezone)
+            event_end = converter.parse_local(
+                self.event_details['event_end_date'], self.event_details['event_end_time'], self.timezone)
+            recurrence = parse_recurrence(self.event_details, self.timezone)
+
+            # if not validate_time_input(event_start, event_end):
             #     raise ValueError(
             #         "Event start time is either past or after event end time")
 
@@ -230,28 +406,25 @@ class CreateServerView(discord.ui.View):
             return
 
         # Database operations
-        async with bot.pool.acquire() as conn:
-
-            # Insert new event
-            eid = await conn.fetchval(
-                "INSERT INTO event (uiud, gid, meetingname, location, timestart, timeend) VALUES ($1, $2, $3, $4, $5, $6) RETURNING eid",
-                self.uiud, self.gid, event_name, event_location, event_start, event_end)
-
-            if eid:
-                await conn.execute(
-                    "INSERT INTO scheduled (uiud, eid, status, notification) VALUES ($1, $2, 'Yes', 0)",
-                    self.uiud, eid)
-                role_name = f"Event {eid}"
-                await notification_role(interaction.guild, interaction.user.id, role_name)
-                await interaction.response.send_message(
-                    f"{interaction.user.mention}, {event_name} at {event_location} has been scheduled for {date_format(self.event_details['event_start_date'])} to {date_format(self.event_details['event_end_date'])} from {convert_locale(local_to_utc(self.event_details['event_start_time']), self.timezone)} to {convert_locale(local_to_utc(self.event_details['event_end_time']), self.timezone)}.", ephemeral=True)
+        eid = await bot.db.create_event(self.uiud, self.user_name, self.gid, event_name, event_location, event_start, event_end,
+                                        role_gid=interaction.guild_id, user_id=interaction.user.id,
+                                        recurrence=recurrence)
+
+        if eid:
+            bot.event_cache.invalidate_guild(self.gid)
+            bot.event_index.add_event(eid, self.gid, self.uiud, event_name)
+            bot.outbox.wake()
+            start_date, start_time, end_date, end_time = converter.convert_many(
+                [{'timestart': event_start, 'timeend': event_end}], self.timezone)[0]
+            await interaction.response.send_message(
+                f"{interaction.user.mention}, {event_name} at {event_location} has been scheduled for {start_date} to {end_date} from {start_time} to {end_time}.", ephemeral=True)
 
-            else:
-                await interaction.response.send_message(
-                    f"{interaction.user.mention}, there was an issue creating the event.",
-                    ephemeral=True)
+        else:
+            await interaction.response.send_message(
+                f"{interaction.user.mention}, there was an issue creating the event.",
+                ephemeral=True)
 
-            self.future.set_result(True)
+        self.future.set_result(True)
 
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.grey)
     async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -274,26 +447,12 @@ class DeleteView(discord.ui.View):
             await interaction.response.send_message("You are not authorized to perform this action.", ephemeral=True)
             return
 
-        async with self.bot.pool.acquire() as conn:
-            # Delete the event
-            await conn.execute("DELETE FROM scheduled WHERE eid = $1", self.event_id)
-            await conn.execute("DELETE FROM event WHERE eid = $1", self.event_id)
-
-            server = self.interaction.guild
-            if server:
-                role_name = f"Event {self.event_id}"
-                role = discord.utils.get(server.roles, name=role_name)
-                if role:
-                    try:
-                        await role.delete(reason=f"Event {self.event_id} deleted")
-                    except discord.Forbidden:
-                        await interaction.response.send_message("The bot does not have permissions to delete roles, and the notification role has not been deleted. Please contact your server admins for help.", ephemeral=True)
-                        return
-                    except discord.HTTPException as e:
-                        await interaction.response.send_message(f"Failed to delete notification role: {e}, please notify your admins to delete this role.", ephemeral=True)
-                        return
-
-            await interaction.response.send_message(f"Event '{self.event_name}' has been successfully deleted.", ephemeral=True)
+        # Delete the event and its signups, queueing its role's deletion
+        await self.bot.db.delete_event(self.event_id, self.interaction.guild_id)
+        self.bot.event_cache.invalidate_event(self.event_id, self.interaction.guild_id)
+        self.bot.event_index.remove_event(self.event_id)
+        self.bot.outbox.wake()
+        await interaction.response.send_message(f"Event '{self.event_name}' has been successfully deleted.", ephemeral=True)
         self.value = True
         self.stop()
 
@@ -303,14 +462,20 @@ class DeleteView(discord.ui.View):
         self.stop()
 
 
+# Pages through a KeysetPager, only the rows on screen are kept. Rendered pages are memoized
+# per (page, timezone) and the next page is rendered while the user reads the current one.
 class PaginationView(View):
-    def __init__(self, data, embed_creator, interaction):
+    def __init__(self, pager, embed_creator, interaction, timezone, cache_pages=5):
         super().__init__()
-        self.data = data
+        self.pager = pager
         self.embed_creator = embed_creator
         self.interaction = interaction
-        self.current_page = 0
-        self.total_pages = len(data)
+        self.timezone = timezone
+        # (page, timezone) -> (rows, embed)
+        self.pages = LRUCache(cache_pages)
+        self.renders = 0
+        self.render_time = 0.0
+        self._speculative = None
 
         # Previous button
         self.previous_button = Button(
@@ -320,30 +485,73 @@ class PaginationView(View):
 
         # Next button
         self.next_button = Button(
-            label='Next', style=discord.ButtonStyle.grey, disabled=self.total_pages <= 1)
+            label='Next', style=discord.ButtonStyle.grey, disabled=not pager.has_next)
         self.next_button.callback = self.on_next
         self.add_item(self.next_button)
 
+    def _render(self, index, rows):
+        key = (index, self.timezone)
+        cached = self.pages.get(key)
+        if cached is None:
+            started = time.perf_counter()
+            cached = (rows, self.embed_creator(rows, self.timezone))
+            self.render_time += time.perf_counter() - started
+            self.renders += 1
+            self.pages.set(key, cached)
+        return cached[1]
+
+    def render(self):
+        embed = self._render(self.pager.index, self.pager.rows)
+        embed.set_footer(text=f"Page {self.pager.index + 1}/{self.pager.total_pages} · {self.pager.total} event(s)")
+        self.previous_button.disabled = not self.pager.has_previous
+        self.next_button.disabled = not self.pager.has_next
+        self._render_ahead()
+        return embed
+
+    def _render_ahead(self):
+        if self._speculative and not self._speculative.done():
+            self._speculative.cancel()
+        if self.pager.has_next and (self.pager.index + 1, self.timezone) not in self.pages:
+            self._speculative = asyncio.create_task(self._render_next(self.pager.index + 1))
+
+    async def _render_next(self, index):
+        rows = await self.pager.peek_next()
+        if rows:
+            self._render(index, rows)
+
+    async def _move(self, index, step):
+        # a page rendered before needs neither a query nor a render
+        cached = self.pages.peek((index, self.timezone))
+        if cached is not None:
+            self.pager.seek(index, cached[0])
+        else:
+            await step()
+
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         return interaction.user.id == self.interaction.user.id
 
     async def on_previous(self, interaction: discord.Interaction):
         # Move to prev page and update embed/buttons
-        if self.current_page > 0:
-            self.current_page -= 1
-            embed = self.embed_creator(self.data[self.current_page])
-            self.previous_button.disabled = self.current_page == 0
-            self.next_button.disabled = self.current_page == self.total_pages - 1
-            await interaction.response.edit_message(embed=embed, view=self)
+        if self.pager.has_previous:
+            await self._move(self.pager.index - 1, self.pager.previous)
+        await interaction.response.edit_message(embed=self.render(), view=self)
 
     async def on_next(self, interaction: discord.Interaction):
         # Move to next page and update embed/buttons
-        if self.current_page < self.total_pages - 1:
-            self.current_page += 1
-            embed = self.embed_creator(self.data[self.current_page])
-            self.previous_button.disabled = self.current_page == 0
-            self.next_button.disabled = self.current_page == self.total_pages - 1
-            await interaction.response.edit_message(embed=embed, view=self)
+        if self.pager.has_next:
+            await self._move(self.pager.index + 1, self.pager.next)
+        await interaction.response.edit_message(embed=self.render(), view=self)
+
+    def stats(self):
+        return dict(self.pages.stats(), renders=self.renders,
+                    avg_render_ms=self.render_time / self.renders * 1000 if self.renders else 0.0)
+
+    async def on_timeout(self):
+        if self._speculative:
+            self._speculative.cancel()
+        self.pager.close()
+        stats = self.stats()
+        print(f"Listing closed: {stats['renders']} render(s), {stats['avg_render_ms']:.2f} ms avg, {stats['hit_rate']:.0%} page cache hits")
 
 
 class NotificationView(discord.ui.View):
@@ -358,23 +566,15 @@ class NotificationView(discord.ui.View):
 
     @discord.ui.button(label="Notify Me", style=discord.ButtonStyle.green)
     async def notify_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        async with bot.pool.acquire() as conn:
-            existing_signup = await conn.fetchrow(
-                "SELECT * FROM scheduled WHERE uiud = $1 AND eid = $2",
-                self.uiud, self.event_id
-            )
-            if not existing_signup:
-                await conn.execute(
-                    "INSERT INTO scheduled (uiud, eid, status, notification) VALUES ($1, $2, 'Yes', 1)",
-                    self.uiud, self.event_id
-                )
-                role_name = f"Event {self.event_id}"
-                await notification_role(interaction.guild, interaction.user.id, role_name)
-                await interaction.response.send_message(f"You will be notified for '{self.event_name}'.", ephemeral=True)
-                self.future.set_result(True)
-            else:
-                await interaction.response.send_message(f"You are already signed up for '{self.event_name}'.", ephemeral=True)
-                self.future.set_result(True)
+        added = await bot.db.add_signup(self.uiud, interaction.user.name, self.event_id, 1,
+                                        role_gid=interaction.guild_id, user_id=interaction.user.id)
+        if added:
+            bot.outbox.wake()
+            await interaction.response.send_message(f"You will be notified for '{self.event_name}'.", ephemeral=True)
+            self.future.set_result(True)
+        else:
+            await interaction.response.send_message(f"You are already signed up for '{self.event_name}'.", ephemeral=True)
+            self.future.set_result(True)
 
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.grey)
     async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -393,59 +593,25 @@ class RemoveNotificationView(discord.ui.View):
 
     @discord.ui.button(label="Remove Notification", style=discord.ButtonStyle.red)
     async def remove_button(self,  interaction: discord.Interaction, button: discord.ui.Button):
-        # Logic to remove the notification
-        async with bot.pool.acquire() as conn:
-            # Check if the user is signed up for the event
-            signup = await conn.fetchrow(
-                "SELECT * FROM scheduled WHERE uiud = $1 AND eid = $2",
-                self.uiud, self.event_id
+        # Logic to remove the notification, False if the user wasn't signed up
+        removed = await bot.db.remove_signup(self.uiud, self.event_id, role_gid=self.interaction.guild_id)
+        if removed:
+            bot.outbox.wake()
+
+            await interaction.response.send_message(
+                f"You will no longer receive notifications for event ID {self.event_id}.",
+                ephemeral=True
             )
-            print(f"Query result: {signup}")
-            if signup:
-                # Remove the user from the scheduled table
-                await conn.execute(
-                    "DELETE FROM scheduled WHERE uiud = $1 AND eid = $2",
-                    self.uiud, self.event_id
-                )
-
-                # Attempt to remove the role from server user
-                server = self.interaction.guild
-                if server:
-                    role_name = f"Event {self.event_id}"
-                    role = discord.utils.get(server.roles, name=role_name)
-                    member = server.get_member(int(self.uiud))
-                    if role and member:
-                        try:
-                            await member.remove_roles(role, reason=f"User opted out of event {self.event_id} notifications")
-                        except discord.Forbidden:
-                            await interaction.response.send_message(
-                                "The bot does not have permissions to delete roles, and the notification role has not been removed. Please contact your server admins for help.",
-                                ephemeral=True
-                            )
-                            self.future.set_result(True)
-                            return
-                        except discord.HTTPException as e:
-                            await interaction.response.send_message(
-                                f"Failed to delete notification role: {e}, please notify your admins to delete this role.",
-                                ephemeral=True
-                            )
-                            self.future.set_result(True)
-                            return
-
-                await interaction.response.send_message(
-                    f"You will no longer receive notifications for event ID {self.event_id}.",
-                    ephemeral=True
-                )
-                self.future.set_result(True)
+            self.future.set_result(True)
 
-            else:
-                await interaction.response.send_message(
-                    f"You are not signed up for notifications for event ID {self.event_id}, or it does not exist.",
-                    ephemeral=True
-                )
-                self.future.set_result(True)
+        else:
+            await interaction.response.send_message(
+                f"You are not signed up for notifications for event ID {self.event_id}, or it does not exist.",
+                ephemeral=True
+            )
+            self.future.set_result(True)
 
-            self.stop()
+        self.stop()
 
     @discord.ui.button(label="Cancel", style=discord.ButtonStyle.grey)
     async def cancel_button(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -455,6 +621,30 @@ class RemoveNotificationView(discord.ui.View):
         self.stop()
 
 
+# Lists the creator's events that overlap the new one. Unparseable dates and an end before the
+# start have nothing to overlap, so no warning is added for them.
+async def add_conflict_warning(embed, uiud, event_details, timezone):
+    try:
+        start = converter.parse_local(event_details['event_start_date'], event_details['event_start_time'], timezone)
+        end = converter.parse_local(event_details['event_end_date'], event_details['event_end_time'], timezone)
+    except ValueError:
+        return
+    if end <= start:
+        # tsrange() rejects a lower bound above the upper one
+        return
+    rows = await bot.db.fetch('busy_events', [uiud], start, end)
+    conflicts = [row for row in rows if overlapping(row, start, end)]
+    if not conflicts:
+        return
+    lines = [f"{row['meetingname']} (ID: {row['eid']})" for row in conflicts[:5]]
+    if len(conflicts) > 5:
+        lines.append(f"...and {len(conflicts) - 5} more")
+    embed.add_field(name="⚠️ Overlaps with", value="\n".join(lines), inline=False)
+
+
+REPEAT_CHOICES = [app_commands.Choice(name=rule, value=rule) for rule in RULES]
+
+
 # create private event
 @bot.tree.command(name="create_private_event")
 @app_commands.describe(
@@ -463,24 +653,36 @@ class RemoveNotificationView(discord.ui.View):
     event_start_date="Event Start Date (YYYY-MM-DD)",
     event_end_date="Event End Date (YYYY-MM-DD)",
     event_start_time="Event Start Time (HH:MM:SS)",
-    event_end_time="Event End Time (HH:MM:SS)"
+    event_end_time="Event End Time (HH:MM:SS)",
+    repeat="Repeat the event every day, week or month",
+    repeat_until="Last date the event repeats on (YYYY-MM-DD), forever if left out"
 )
+@app_commands.choices(repeat=REPEAT_CHOICES)
 async def create_private_event(
     interaction: discord.Interaction,
-    event_name: str,
+    event_name: app_commands.Range[str, 1, MAX_NAME_LENGTH],
     event_location: str,
     event_start_date: str,
     event_end_date: str,
     event_start_time: str,
-    event_end_time: str
+    event_end_time: str,
+    repeat: Optional[str] = None,
+    repeat_until: Optional[str] = None
 ):
+    if repeat_until and not valid_date(repeat_until):
+        # checked up front, the confirmation embed formats it
+        await interaction.response.send_message("repeat_until must be a date in the YYYY-MM-DD format.", ephemeral=True)
+        return
+
     event_details = {
         'event_name': event_name,
         'event_location': event_location,
         'event_start_date': event_start_date,
         'event_end_date': event_end_date,
         'event_start_time': event_start_time,
-        'event_end_time': event_end_time
+        'event_end_time': event_end_time,
+        'repeat': repeat,
+        'repeat_until': repeat_until
     }
     uiud = str(interaction.user.id)
     user_name = interaction.user.name
@@ -497,10 +699,14 @@ async def create_private_event(
         name="📅 Dates", value=f"{date_format(event_start_date)} to {date_format(event_end_date)}", inline=False)
     embed.add_field(
         name="⏰ Time", value=f"{event_start_time} to {event_end_time}", inline=False)
+    if repeat:
+        embed.add_field(
+            name="🔁 Repeats", value=f"{repeat}, until {date_format(repeat_until)}" if repeat_until else repeat, inline=False)
 
-    # Questionable if this even works...
     embed.timestamp = datetime.now()
-    timezone = find_timezone(embed.timestamp)
+    timezone = await bot.profiles.get(uiud)
+    embed.set_footer(text=f"Times are in {timezone}, change it with /set_timezone")
+    await add_conflict_warning(embed, uiud, event_details, timezone)
 
     # Sending the embed
     view = CreatePrivateView(
@@ -525,20 +731,29 @@ async def create_private_event(
     event_end_date="Event End Date (YYYY-MM-DD)",
     event_start_time="Event Start Time (HH:MM:SS)",
     event_end_time="Event End Time (HH:MM:SS)",
-    event_location="Event Location"
+    event_location="Event Location",
+    repeat="Repeat the event every day, week or month",
+    repeat_until="Last date the event repeats on (YYYY-MM-DD), forever if left out"
 )
+@app_commands.choices(repeat=REPEAT_CHOICES)
 async def create_group_event(
     interaction: discord.Interaction,
-    event_name: str,
+    event_name: app_commands.Range[str, 1, MAX_NAME_LENGTH],
     event_location: str,
     event_start_date: str,
     event_end_date: str,
     event_start_time: str,
-    event_end_time: str
+    event_end_time: str,
+    repeat: Optional[str] = None,
+    repeat_until: Optional[str] = None
 ):
     if interaction.guild is None:
         await interaction.response.send_message("This is for creating server events!", ephemeral=True)
         return
+    if repeat_until and not valid_date(repeat_until):
+        # checked up front, the confirmation embed formats it
+        await interaction.response.send_message("repeat_until must be a date in the YYYY-MM-DD format.", ephemeral=True)
+        return
 
     gid = interaction.guild_id
     uiud = str(interaction.user.id)
@@ -550,7 +765,9 @@ async def create_group_event(
         'event_start_date': event_start_date,
         'event_end_date': event_end_date,
         'event_start_time': event_start_time,
-        'event_end_time': event_end_time
+        'event_end_time': event_end_time,
+        'repeat': repeat,
+        'repeat_until': repeat_until
     }
     embed = discord.Embed(
         title="Event Confirmation",
@@ -566,9 +783,14 @@ async def create_group_event(
         name="📅 Dates", value=f"{date_format(event_start_date)} to {date_format(event_end_date)}", inline=False)
     embed.add_field(
         name="⏰ Time", value=f"{event_start_time} to {event_end_time}", inline=False)
+    if repeat:
+        embed.add_field(
+            name="🔁 Repeats", value=f"{repeat}, until {date_format(repeat_until)}" if repeat_until else repeat, inline=False)
 
     embed.timestamp = datetime.now()
-    timezone = find_timezone(embed.timestamp)
+    timezone = await bot.profiles.get(uiud)
+    embed.set_footer(text=f"Times are in {timezone}, change it with /set_timezone")
+    await add_conflict_warning(embed, uiud, event_details, timezone)
 
     view = CreateServerView(
         event_details=event_details,
@@ -588,6 +810,116 @@ async def create_group_event(
         print(f"Error in deleting message after submit: {e}")
 
 
+# import events from an .ics calendar or a CSV file
+@bot.tree.command(name="import_events", description="Import events from an .ics calendar or a CSV file.")
+@app_commands.describe(
+    file="An .ics file, or a CSV with name, location, start_date, start_time, end_date, end_time columns"
+)
+async def import_events(interaction: discord.Interaction, file: discord.Attachment):
+    await interaction.response.defer(ephemeral=True)
+
+    uiud = str(interaction.user.id)
+    # imported in a server they become server events, in DMs private ones
+    gid = interaction.guild_id
+    timezone = await bot.profiles.get(uiud)
+
+    if file.size > MAX_IMPORT_BYTES:
+        # checked before downloading, load_events only sees what was read
+        await interaction.followup.send(f"Files can be at most {MAX_IMPORT_BYTES // 1024} KB.", ephemeral=True)
+        return
+
+    try:
+        events, errors = load_events(file.filename, await file.read(), timezone)
+    except ImportFormatError as e:
+        await interaction.followup.send(str(e), ephemeral=True)
+        return
+
+    if not events:
+        await interaction.followup.send("No events could be imported.\n" + "\n".join(errors[:10]), ephemeral=True)
+        return
+
+    started = time.perf_counter()
+    eids = await bot.db.import_events(uiud, interaction.user.name, gid, events,
+                                      role_gid=gid, user_id=interaction.user.id)
+    elapsed = time.perf_counter() - started
+    if gid:
+        bot.event_cache.invalidate_guild(gid)
+        bot.outbox.wake()
+    print(f"Imported {len(eids)} events for {uiud} in {elapsed:.2f}s")
+
+    message = f"Imported {len(eids)} event(s) from {file.filename}, times without a timezone were read as {timezone}."
+    if errors:
+        message += f"\nSkipped {len(errors)} row(s):\n" + "\n".join(errors[:10])
+        if len(errors) > 10:
+            message += f"\n...and {len(errors) - 10} more"
+    await interaction.followup.send(message[:MESSAGE_LIMIT], ephemeral=True)
+
+
+# Discord won't take files past this
+EXPORT_LIMIT_BYTES = 25 * 1024 * 1024
+
+
+# export events as an .ics calendar
+@bot.tree.command(name="export_events", description="Export events as an .ics calendar file.")
+@app_commands.describe(
+    scope="This server's events, or your private events and sign-ups"
+)
+@app_commands.choices(scope=[
+    app_commands.Choice(name="server", value="server"),
+    app_commands.Choice(name="personal", value="personal"),
+])
+async def export_events(interaction: discord.Interaction, scope: Optional[str] = None):
+    gid = interaction.guild_id
+    uiud = str(interaction.user.id)
+    scope = scope or ("server" if gid else "personal")
+    if scope == "server" and gid is None:
+        await interaction.response.send_message("Server events can only be exported while using this command in a server.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    if scope == "server":
+        rows = bot.db.cursor('export_server_events', gid)
+        calendar_name, feed = f"{interaction.guild.name} events", ('guild', gid)
+    else:
+        rows = bot.db.cursor('export_user_events', uiud)
+        calendar_name, feed = f"{interaction.user.name}'s events", ('user', uiud)
+
+    # rows arrive from a cursor and are written out chunk by chunk, big exports spill to disk
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+        if not await spool_ics(rows, calendar_name, spool, EXPORT_LIMIT_BYTES):
+            await interaction.followup.send("Too many events to export as a file.", ephemeral=True)
+            return
+
+        message = "Here are your events."
+        feed_url = bot.calendar_feed.url(*feed) if bot.calendar_feed else None
+        if feed_url:
+            message += f"\nSubscribe to stay in sync: <{feed_url}>"
+        await interaction.followup.send(message, file=discord.File(spool, filename="events.ics"), ephemeral=True)
+
+
+# Event-ID autocomplete, answered from bot.event_index without a query per keystroke
+def event_choices(matches):
+    return [app_commands.Choice(name=f"{name[:80]} (ID: {eid})", value=eid) for eid, name in matches]
+
+
+async def owned_event_choices(interaction: discord.Interaction, current: str):
+    uiud = str(interaction.user.id)
+    index = await bot.event_index.user(uiud)
+    return event_choices(index.search(current, owner=uiud))
+
+
+async def signed_up_event_choices(interaction: discord.Interaction, current: str):
+    index = await bot.event_index.user(interaction.user.id)
+    return event_choices(index.search(current))
+
+
+async def guild_event_choices(interaction: discord.Interaction, current: str):
+    if interaction.guild_id is None:
+        return []
+    index = await bot.event_index.guild(interaction.guild_id)
+    return event_choices(index.search(current))
+
+
 # delete event
 @bot.tree.command(name="delete_event")
 @app_commands.describe(
@@ -597,35 +929,41 @@ async def delete_event(interaction: discord.Interaction, event_id: int):
     uiud = str(interaction.user.id)
     gid = interaction.guild_id
 
-    async with bot.pool.acquire() as conn:
-        # Check if event exists
-        event = await conn.fetchrow("SELECT * FROM event WHERE eid = $1 AND uiud = $2", event_id, uiud)
-
-        if event:
-
-            embed = discord.Embed(
-                title="Event Deletion Confirmation", color=discord.Color.red())
-            embed.add_field(name="Event ID", value=event_id)
-            embed.add_field(name="Event Name", value=event['meetingname'])
-            embed.set_footer(
-                text="Please confirm if you want to delete this event.")
-
-            view = DeleteView(interaction, event_id, event['meetingname'], bot)
-
-            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
-            await view.wait()
-            try:
-                await interaction.delete_original_response()
-            except discord.NotFound:
-                # Message might be already deleted, ignore this exception
-                pass
-            except Exception as e:
-                print(f"Error in deleting message after submit: {e}")
-        else:
-            await interaction.response.send_message(
-                f"{interaction.user.mention}, event '{event_id}' not found or you don't have permission to delete it.",
-                ephemeral=True
-            )
+    # Check if event exists
+    event = await bot.event_cache.get_event(event_id)
+    if event and event['uiud'] != uiud:
+        event = None
+
+    if event:
+
+        embed = discord.Embed(
+            title="Event Deletion Confirmation", color=discord.Color.red())
+        embed.add_field(name="Event ID", value=event_id)
+        embed.add_field(name="Event Name", value=event['meetingname'])
+        embed.set_footer(
+            text="Please confirm if you want to delete this event.")
+
+        view = DeleteView(interaction, event_id, event['meetingname'], bot)
+
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        await view.wait()
+        try:
+            await interaction.delete_original_response()
+        except discord.NotFound:
+            # Message might be already deleted, ignore this exception
+            pass
+        except Exception as e:
+            print(f"Error in deleting message after submit: {e}")
+    else:
+        await interaction.response.send_message(
+            f"{interaction.user.mention}, event '{event_id}' not found or you don't have permission to delete it.",
+            ephemeral=True
+        )
+
+
+@delete_event.autocomplete('event_id')
+async def delete_event_autocomplete(interaction: discord.Interaction, current: str):
+    return await owned_event_choices(interaction, current)
 
 
 # List server events
@@ -635,46 +973,31 @@ async def list_server_events(interaction: discord.Interaction):
         await interaction.response.send_message("Server events can only be displayed while using this command in a server.", ephemeral=True)
         return
 
-    async with bot.pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT eid, meetingname, location, timestart, timeend FROM event WHERE gid = $1",
-            interaction.guild_id
-        )
+    # every member pages through the same guild listing, so it's served from the event cache
+    pager = KeysetPager(bot.event_cache.guild(interaction.guild_id),
+                        'server_events_after', 'server_events_before', 'server_events_count', (interaction.guild_id,))
+    await pager.open()
 
-    if not rows:
+    if not pager.rows:
         await interaction.response.send_message(f"No events available for {interaction.guild.name}.")
         return
 
-    # Paginate rows into pages of events
-    events_per_page = 4
-    pages = [rows[i:i + events_per_page]
-             for i in range(0, len(rows), events_per_page)]
+    timezone = await bot.profiles.get(interaction.user.id)
 
-    def create_embed(page_rows):
+    def create_embed(page_rows, timezone):
         embed = discord.Embed(title=f"Events for {interaction.guild.name}")
 
         embed.timestamp = datetime.now()
-        timezone = find_timezone(embed.timestamp)
 
-        for row in page_rows:
-            start_time_info = row['timestart'].strftime(
-                '%Y-%m-%d %H:%M:%S'
-            )
-            end_time_info = row['timeend'].strftime(
-                '%Y-%m-%d %H:%M:%S'
-            )
-            start_date, start_time = start_time_info.split(' ')
-            end_date, end_time = end_time_info.split(' ')
-
-            start_date, end_date = date_format(
-                start_date), date_format(end_date)
+        times = converter.convert_many(page_rows, timezone)
+        for row, (start_date, start_time, end_date, end_time) in zip(page_rows, times):
             embed.add_field(name=f"{row['meetingname']} (ID: {row['eid']})",
-                            value=f"\n📍 Location: {row['location']} \n 📅 Date: {start_date} to {end_date} \n⌚ Time: {convert_locale(start_time, timezone)} to {convert_locale(end_time, timezone)}.\n", inline=False)
+                            value=f"\n📍 Location: {row['location']} \n 📅 Date: {start_date} to {end_date} \n⌚ Time: {start_time} to {end_time}.\n"
+                                  + describe_recurrence(row, timezone), inline=False)
         return embed
 
-    view = PaginationView(pages, create_embed, interaction)
-    embed = create_embed(pages[0])
-    await interaction.response.send_message(embed=embed, view=view)
+    view = PaginationView(pager, create_embed, interaction, timezone)
+    await interaction.response.send_message(embed=view.render(), view=view)
 
 
 # list out all events (private, public)
@@ -684,60 +1007,33 @@ async def show_events(interaction: discord.Interaction):
 
     uiud = str(interaction.user.id)
     gid = interaction.guild_id
-    async with bot.pool.acquire() as conn:
-        personal = await conn.fetch(
-            "SELECT eid, meetingname, location, timestart, timeend FROM event WHERE uiud = $1 AND gid IS NULL", uiud
-        )
-        if gid:
-            server = await conn.fetch(
-                """
-                SELECT e.eid, e.meetingname, e.location, e.timestart, e.timeend
-                FROM event e
-                INNER JOIN scheduled s ON e.eid = s.eid
-                WHERE e.gid = $1 AND s.uiud = $2
-                """, gid, uiud
-            )
-        else:
-            server = []
-
-    rows = personal + server
+    pager = KeysetPager(bot.db, 'user_events_after', 'user_events_before', 'user_events_count', (uiud, gid))
+    await pager.open()
 
-    if not rows:
+    if not pager.rows:
         await interaction.followup.send("You have no events scheduled.", ephemeral=True)
         return
 
-    events_per_page = 4
-    pages = [rows[i:i + events_per_page]
-             for i in range(0, len(rows), events_per_page)]
+    timezone = await bot.profiles.get(uiud)
 
-    def create_embed(page_rows):
+    def create_embed(page_rows, timezone):
         embed = discord.Embed(title="Your Events")
         embed.timestamp = datetime.now()
-        timezone = find_timezone(embed.timestamp)
-
-        for row in page_rows:
-            start_time_info = row['timestart'].strftime('%Y-%m-%d %H:%M:%S')
-            end_time_info = row['timeend'].strftime('%Y-%m-%d %H:%M:%S')
-            start_date, start_time = start_time_info.split(' ')
-            end_date, end_time = end_time_info.split(' ')
-
-            start_time, end_time = convert_locale(
-                start_time, timezone), convert_locale(end_time, timezone)
-            start_date, end_date = date_format(
-                start_date), date_format(end_date)
 
+        times = converter.convert_many(page_rows, timezone)
+        for row, (start_date, start_time, end_date, end_time) in zip(page_rows, times):
             embed.add_field(
                 name=f"{row['meetingname']} (ID: {row['eid']})",
-                value=f"📍 Location: {row['location']}\n 📅 Date: {start_date} to {end_date}\n ⏲ Time: {start_time} to {end_time}",
+                value=f"📍 Location: {row['location']}\n 📅 Date: {start_date} to {end_date}\n ⏲ Time: {start_time} to {end_time}\n"
+                      + describe_recurrence(row, timezone),
                 inline=False
             )
 
         return embed
 
     # Initialize and send the first page
-    view = PaginationView(pages, create_embed, interaction)
-    embed = create_embed(pages[0])
-    await interaction.followup.send(embed=embed, view=view, ephemeral=True)
+    view = PaginationView(pager, create_embed, interaction, timezone)
+    await interaction.followup.send(embed=view.render(), view=view, ephemeral=True)
 
 
 @bot.tree.command(name="get_notified")
@@ -750,58 +1046,45 @@ async def get_notified(interaction: discord.Interaction, event_number: int):
 
     uiud = str(interaction.user.id)
     gid = interaction.guild_id
+    timezone = await bot.profiles.get(uiud)
 
-    async with bot.pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT * FROM \"user\" WHERE uiud = $1", uiud)
-        if user is None:
-            await conn.execute("INSERT INTO \"user\" (uiud, name) VALUES ($1, $2)", uiud, interaction.user.name)
+    await bot.db.execute('ensure_user', uiud, interaction.user.name)
+    event = await bot.event_cache.get_event(event_number)
 
-        event = await conn.fetchrow(
-            # AND gid = $2",
-            "SELECT meetingname, eid, location, timestart, timeend FROM event WHERE eid = $1",
-            event_number  # ,gid
+    if event:
+        embed = discord.Embed(title=event['meetingname'])
+        embed.timestamp = datetime.now()
+        start_date, start_time, end_date, end_time = converter.convert_many([event], timezone)[0]
+        # embed = discord.Embed(name=f"{event['meetingname']}
+
+        embed.add_field(name=f"(ID: {event['eid']})",
+                        value=f"\n📍 Location: {event['location']} \n 📅 Date: {start_date} to {end_date} \n⌚ Time: {start_time} to {end_time}.\n", inline=False)
+        view = NotificationView(
+            event['eid'], event['meetingname'], interaction.user.id, uiud, gid
         )
 
-        if event:
-            start_time_info = event['timestart'].strftime(
-                '%Y-%m-%d %H:%M:%S'
-            )
-            end_time_info = event['timeend'].strftime(
-                '%Y-%m-%d %H:%M:%S'
-            )
-            start_date, start_time = start_time_info.split(' ')
-            end_date, end_time = end_time_info.split(' ')
-            start_date, end_date = date_format(
-                start_date), date_format(end_date)
-
-            embed = discord.Embed(title=event['meetingname'])
-            embed.timestamp = datetime.now()
-            timezone = find_timezone(embed.timestamp)
-            # embed = discord.Embed(name=f"{event['meetingname']}
-
-            embed.add_field(name=f"(ID: {event['eid']})",
-                            value=f"\n📍 Location: {event['location']} \n 📅 Date: {start_date} to {end_date} \n⌚ Time: {convert_locale(start_time, timezone)} to {convert_locale(end_time, timezone)}.\n", inline=False)
-            view = NotificationView(
-                event['eid'], event['meetingname'], interaction.user.id, uiud, gid
-            )
+        await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
 
-            await interaction.response.send_message(embed=embed, view=view, ephemeral=True)
+        await view.future
 
-            await view.future
+        try:
+            await interaction.delete_original_response()
+        except discord.NotFound:
+            # Message might be already deleted, ignore this exception
+            pass
+        except Exception as e:
+            print(f"Error in deleting message after submit: {e}")
+
+    else:
+        await interaction.response.send_message(
+            f"Event number {event_number} is either not in this server, or the event number is invalid",
+            ephemeral=True
+        )
 
-            try:
-                await interaction.delete_original_response()
-            except discord.NotFound:
-                # Message might be already deleted, ignore this exception
-                pass
-            except Exception as e:
-                print(f"Error in deleting message after submit: {e}")
 
-        else:
-            await interaction.response.send_message(
-                f"Event number {event_number} is either not in this server, or the event number is invalid",
-                ephemeral=True
-            )
+@get_notified.autocomplete('event_number')
+async def get_notified_autocomplete(interaction: discord.Interaction, current: str):
+    return await guild_event_choices(interaction, current)
 
 
 @bot.tree.command(name="remove_notification")
@@ -832,39 +1115,72 @@ async def remove_notification(interaction: discord.Interaction, event_id: int):
         print(f"Error in deleting message after submit: {e}")
 
 
-async def notification_role(server, user_id, role_name):
-    if server:
-        existing_role = discord.utils.get(server.roles, name=role_name)
+@remove_notification.autocomplete('event_id')
+async def remove_notification_autocomplete(interaction: discord.Interaction, current: str):
+    return await signed_up_event_choices(interaction, current)
+
+
+# Outbox handlers. They run in the outbox worker, never in the request path, and have to be
+# safe to repeat since a message may be retried after a partial failure.
+async def assign_event_role(payload):
+    server = bot.get_guild(payload['gid'])
+    if not server:
+        raise PermanentError(f"Guild {payload['gid']} is not available.")
+    eid = payload['eid']
+
+    existing_role = bot.role_index.get(server, eid)
+    try:
         if not existing_role:
-            # Create the role
-            try:
-                new_role = await server.create_role(name=role_name, mentionable=True, reason="New event role")
-
-            except discord.Forbidden:
-                print(
-                    "The bot does not have permissions to create roles. Please contact your server admins for help.")
-                return None
+            new_role = await server.create_role(name=role_name(eid), mentionable=True, reason="New event role")
+            bot.role_index.add(server.id, eid, new_role.id)
+            await bot.db.execute('set_role_id', new_role.id, eid)
         else:
             new_role = existing_role
             if not new_role.mentionable:
-                try:
-                    await new_role.edit(mentionable=True)
-                except discord.Forbidden:
-                    print(
-                        "The bot does not have permissions to edit roles. Please contact your server admins for help.")
-                    return None
-
-        member = server.get_member(user_id)
-        if member:
-            try:
-                await member.add_roles(new_role, reason="Assigned for event signup")
-                return new_role
-            except discord.Forbidden:
-                print(
-                    "The bot does not have permissions to assign roles. Please contact your server admins for help.")
-        else:
-            print("Member not found in the server.")
-    return None
+                await new_role.edit(mentionable=True)
+    except discord.Forbidden:
+        raise PermanentError(
+            "The bot does not have permissions to create or edit roles. Please contact your server admins for help.")
+
+    member = server.get_member(payload['user_id'])
+    if not member:
+        raise PermanentError("Member not found in the server.")
+    try:
+        await member.add_roles(new_role, reason="Assigned for event signup")
+    except discord.Forbidden:
+        raise PermanentError(
+            "The bot does not have permissions to assign roles. Please contact your server admins for help.")
+
+
+async def remove_event_role(payload):
+    server = bot.get_guild(payload['gid'])
+    if not server:
+        return
+    role = bot.role_index.get(server, payload['eid'])
+    member = server.get_member(payload['user_id'])
+    if role and member:
+        try:
+            await member.remove_roles(role, reason=f"User opted out of event {payload['eid']} notifications")
+        except discord.Forbidden:
+            raise PermanentError(
+                "The bot does not have permissions to remove roles. Please contact your server admins for help.")
+
+
+async def delete_event_role(payload):
+    server = bot.get_guild(payload['gid'])
+    if not server:
+        return
+    role = bot.role_index.get(server, payload['eid'])
+    if role is None and payload.get('role_id'):
+        role = server.get_role(payload['role_id'])
+    if role:
+        try:
+            await role.delete(reason=payload['reason'])
+        except discord.NotFound:
+            pass
+        except discord.Forbidden:
+            raise PermanentError(
+                "The bot doesn't have permission to delete roles in this server, please contact your server admins!")
 
 
 @bot.tree.command(name="modify_event")
@@ -879,63 +1195,144 @@ async def notification_role(server, user_id, role_name):
 )
 async def modify_event(interaction: discord.Interaction,
                        event_id: int,
-                       new_meetingname: Optional[str] = None,
+                       new_meetingname: Optional[app_commands.Range[str, 1, MAX_NAME_LENGTH]] = None,
                        new_location: Optional[str] = None,
                        new_datestart: Optional[str] = None,
                        new_dateend: Optional[str] = None,
                        new_timestart: Optional[str] = None,
                        new_timeend: Optional[str] = None):
     uiud = str(interaction.user.id)
-    async with bot.pool.acquire() as conn:
-        event = await conn.fetchrow("SELECT * FROM event WHERE eid = $1 AND uiud = $2", event_id, uiud)
-        if not event:
-            await interaction.response.send_message("Event not found or you do not have permission to modify this event.", ephemeral=True)
-            return
+    timezone = await bot.profiles.get(uiud)
+    event = await bot.db.fetchrow('owned_event', event_id, uiud)
+    if not event:
+        await interaction.response.send_message("Event not found or you do not have permission to modify this event.", ephemeral=True)
+        return
 
-        fields_to_update = {}
-        if new_meetingname is not None:
-            fields_to_update['meetingname'] = new_meetingname
-        if new_location is not None:
-            fields_to_update['location'] = new_location
+    new_eventstart = new_eventend = None
+    # Handling date and time updates, entered in the user's timezone
+    try:
+        if new_datestart or new_timestart:
+            existing_start = converter.from_utc(event['timestart'], timezone)
+            new_start_date = new_datestart if new_datestart else existing_start.strftime(
+                "%Y-%m-%d")
+            new_start_time = new_timestart if new_timestart else existing_start.strftime(
+                "%H:%M:%S")
+            new_eventstart = converter.parse_local(new_start_date, new_start_time, timezone)
+
+        if new_dateend or new_timeend:
+            existing_end = converter.from_utc(event['timeend'], timezone)
+            new_end_date = new_dateend if new_dateend else existing_end.strftime(
+                "%Y-%m-%d")
+            new_end_time = new_timeend if new_timeend else existing_end.strftime(
+                "%H:%M:%S")
+            new_eventend = converter.parse_local(new_end_date, new_end_time, timezone)
+
+    except ValueError as e:
+        await interaction.response.send_message("Invalid date or time format.", ephemeral=True)
+        return
 
-        # Handling date and time updates
-        try:
-            if new_datestart or new_timestart:
-                existing_start = event['timestart']
-                new_start_date = new_datestart if new_datestart else existing_start.strftime(
-                    "%Y-%m-%d")
-                new_start_time = new_timestart if new_timestart else existing_start.strftime(
-                    "%H:%M:%S")
-                new_eventstart = datetime.strptime(
-                    f"{new_start_date} {new_start_time}", "%Y-%m-%d %H:%M:%S")
-                new_eventstart = (new_eventstart)
-                fields_to_update['timestart'] = new_eventstart
-
-            if new_dateend or new_timeend:
-                existing_end = event['timeend']
-                new_end_date = new_dateend if new_dateend else existing_end.strftime(
-                    "%Y-%m-%d")
-                new_end_time = new_timeend if new_timeend else existing_end.strftime(
-                    "%H:%M:%S")
-                new_eventend = datetime.strptime(
-                    f"{new_end_date} {new_end_time}", "%Y-%m-%d %H:%M:%S")
-                new_eventend = (new_eventend)
-                fields_to_update['timeend'] = new_eventend
+    if any(value is not None for value in (new_meetingname, new_location, new_eventstart, new_eventend)):
+        # one static UPDATE, fields left as None keep their current value
+        await bot.db.update_event(event_id, uiud, new_meetingname, new_location, new_eventstart, new_eventend)
+        bot.event_cache.invalidate_event(event_id, event['gid'])
+        if new_meetingname:
+            bot.event_index.rename_event(event_id, new_meetingname)
+        await interaction.response.send_message("Event updated successfully.", ephemeral=True)
+    else:
+        await interaction.response.send_message("No changes specified for the event.", ephemeral=True)
 
-        except ValueError as e:
-            await interaction.response.send_message("Invalid date or time format.", ephemeral=True)
-            return
 
-        if fields_to_update:
-            set_parts = [f"{key} = ${i + 1}" for i,
-                         key in enumerate(fields_to_update.keys())]
-            values = list(fields_to_update.values())
-            values.append(event_id)
-            update_query = f"UPDATE event SET {', '.join(set_parts)} WHERE eid = ${len(values)}"
-            await conn.execute(update_query, *values)
-            await interaction.response.send_message("Event updated successfully.", ephemeral=True)
-        else:
-            await interaction.response.send_message("No changes specified for the event.", ephemeral=True)
+@modify_event.autocomplete('event_id')
+async def modify_event_autocomplete(interaction: discord.Interaction, current: str):
+    return await owned_event_choices(interaction, current)
+
+
+# longest date range /find_slot searches
+FIND_SLOT_MAX_DAYS = 31
+
+
+# find times everyone with a role is free
+@bot.tree.command(name="find_slot", description="Find times when everyone with a role is free.")
+@app_commands.describe(
+    role="Whose events to check",
+    start_date="First day to search (YYYY-MM-DD)",
+    end_date="Last day to search (YYYY-MM-DD)",
+    duration="How long the slot has to be, in minutes",
+    from_hour="Earliest hour of the day to suggest, in your timezone (0-23)",
+    to_hour="Latest hour of the day a slot can end at, in your timezone (1-24)"
+)
+async def find_slot(
+    interaction: discord.Interaction,
+    role: discord.Role,
+    start_date: str,
+    end_date: str,
+    duration: app_commands.Range[int, 5, 1440],
+    from_hour: app_commands.Range[int, 0, 23] = 9,
+    to_hour: app_commands.Range[int, 1, 24] = 21
+):
+    try:
+        first_day = datetime.strptime(start_date, '%Y-%m-%d').date()
+        last_day = datetime.strptime(end_date, '%Y-%m-%d').date()
+    except ValueError:
+        await interaction.response.send_message("Dates must be in the YYYY-MM-DD format.", ephemeral=True)
+        return
+    if last_day < first_day or (last_day - first_day).days > FIND_SLOT_MAX_DAYS:
+        await interaction.response.send_message(f"Pick a range of up to {FIND_SLOT_MAX_DAYS} days.", ephemeral=True)
+        return
+    if to_hour <= from_hour:
+        await interaction.response.send_message("to_hour has to be after from_hour.", ephemeral=True)
+        return
+    members = [str(member.id) for member in role.members if not member.bot]
+    if not members:
+        await interaction.response.send_message(f"Nobody has the {role.name} role.", ephemeral=True)
+        return
+    await interaction.response.defer(ephemeral=True)
+
+    timezone = await bot.profiles.get(interaction.user.id)
+    rows = await bot.db.fetch('busy_events', members, *search_range(first_day, last_day, timezone))
+    windows = free_windows(rows, first_day, last_day, timedelta(minutes=duration), timezone, from_hour, to_hour)
+
+    embed = discord.Embed(title=f"Free times for {role.name}", color=discord.Color.green())
+    embed.set_footer(text=f"{len(members)} member(s), {len(rows)} event(s) checked · Times are in {timezone}")
+    if not windows:
+        embed.description = "Nobody is free long enough in that range."
+    for start, end in windows:
+        start, end = converter.from_utc(start, timezone), converter.from_utc(end, timezone)
+        embed.add_field(name=converter.format_date(start),
+                        value=f"{converter.format_time(start)} to {converter.format_time(end)}", inline=False)
+    await interaction.followup.send(embed=embed, ephemeral=True)
+
+
+@bot.tree.command(name="set_timezone", description="Set the timezone your event times are entered and shown in.")
+@app_commands.describe(timezone="IANA timezone name, e.g. America/New_York or US/Pacific")
+async def set_timezone(interaction: discord.Interaction, timezone: str):
+    if timezone not in pytz.all_timezones_set:
+        await interaction.response.send_message(f"Unknown timezone '{timezone}'. Use a name like America/New_York or US/Pacific.", ephemeral=True)
+        return
+
+    await bot.profiles.set(interaction.user.id, interaction.user.name, timezone)
+    await interaction.response.send_message(f"Your event times will now be shown in {timezone}.", ephemeral=True)
+
+
+@set_timezone.autocomplete('timezone')
+async def timezone_autocomplete(interaction: discord.Interaction, current: str):
+    current = current.lower()
+    matches = [tz for tz in pytz.common_timezones if current in tz.lower()]
+    return [app_commands.Choice(name=tz, value=tz) for tz in matches[:25]]
+
+
+@bot.tree.command(name="set_reminder_channel", description="Choose the channel server event reminders are posted in.")
+@app_commands.describe(channel="Channel for event reminders")
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.guild_only()
+async def set_reminder_channel(interaction: discord.Interaction, channel: discord.TextChannel):
+    permissions = channel.permissions_for(interaction.guild.me)
+    if not permissions.send_messages:
+        await interaction.response.send_message(f"I don't have permission to send messages in {channel.mention}.", ephemeral=True)
+        return
+
+    await bot.guild_settings.set_reminder_channel(bot.db, interaction.guild_id, channel.id)
+    await interaction.response.send_message(f"Event reminders will now be posted in {channel.mention}.", ephemeral=True)
 
 
 bot.run(os.getenv("DISCORD_TOKEN"))
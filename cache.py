@@ -0,0 +1,106 @@
+import time
+from collections import OrderedDict
+
+
+# Bounded least-recently-used map with hit/miss counters. With a ttl (seconds) entries also
+# expire, an expired entry counts as a miss.
+class LRUCache:
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        # key -> (value, expires at or None)
+        self._data = OrderedDict()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return self._live(key) is not None
+
+    def _live(self, key):
+        entry = self._data.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._data[key]
+            self.expired += 1
+            return None
+        return entry
+
+    def get(self, key, default=None):
+        entry = self._live(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    # no recency update and no hit/miss counted
+    def peek(self, key, default=None):
+        entry = self._live(key)
+        return default if entry is None else entry[0]
+
+    def set(self, key, value):
+        self._data[key] = (value, time.monotonic() + self.ttl if self.ttl else None)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        self._data.clear()
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self):
+        return {'size': len(self._data), 'hits': self.hits, 'misses': self.misses,
+                'expired': self.expired, 'hit_rate': self.hit_rate()}
+
+
+# Resolves users and their DM channels without a REST call when the gateway or a previous
+# lookup already gave us the object
+class UserCache:
+    def __init__(self, bot, maxsize=2048):
+        self.bot = bot
+        self.users = LRUCache(maxsize)
+        self.dm_channels = LRUCache(maxsize)
+        self.fetches = 0
+
+    async def get_user(self, uiud):
+        uiud = int(uiud)
+        user = self.users.get(uiud)
+        if user is None:
+            # the gateway cache is free, only go to the network if it doesn't know the user either
+            user = self.bot.get_user(uiud)
+            if user is None:
+                self.fetches += 1
+                user = await self.bot.fetch_user(uiud)
+            self.users.set(uiud, user)
+        return user
+
+    async def get_dm_channel(self, uiud):
+        uiud = int(uiud)
+        channel = self.dm_channels.get(uiud)
+        if channel is None:
+            user = await self.get_user(uiud)
+            channel = user.dm_channel or await user.create_dm()
+            self.dm_channels.set(uiud, channel)
+        return channel
+
+    async def send(self, uiud, content):
+        channel = await self.get_dm_channel(uiud)
+        return await channel.send(content)
+
+    def discard(self, uiud):
+        self.users.pop(int(uiud))
+        self.dm_channels.pop(int(uiud))
+
+    def stats(self):
+        return {'users': self.users.stats(), 'dm_channels': self.dm_channels.stats(), 'fetches': self.fetches}
@@ -0,0 +1,86 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+import asyncpg
+
+CHANNEL = "event_changes"
+
+
+def parse_time(value):
+    if value is None:
+        return None
+    parsed = datetime.fromisoformat(value)
+    # the rest of the bot works with naive UTC datetimes
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def parse_change(payload):
+    change = json.loads(payload)
+    for key in ('timestart', 'timeend', 'old_timestart'):
+        if key in change:
+            change[key] = parse_time(change[key])
+    return change
+
+
+# Holds a dedicated LISTEN connection and fans decoded changes out to subscribers.
+# Subscribers get a resync call whenever notifications may have been missed.
+class ChangeFeed:
+    def __init__(self, connect_kwargs, channel=CHANNEL, reconnect_delay=5):
+        self.connect_kwargs = connect_kwargs
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._subscribers = []
+        self._conn = None
+        self._closing = False
+        self._reconnect_task = None
+
+    def subscribe(self, on_change, on_resync=None):
+        self._subscribers.append((on_change, on_resync))
+
+    async def start(self):
+        self._closing = False
+        self._conn = await asyncpg.connect(**self.connect_kwargs)
+        self._conn.add_termination_listener(self._on_terminate)
+        await self._conn.add_listener(self.channel, self._on_notify)
+
+    async def close(self):
+        self._closing = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    def _on_notify(self, conn, pid, channel, payload):
+        try:
+            change = parse_change(payload)
+        except ValueError as e:
+            print(f"Ignoring malformed change notification: {e}")
+            return
+
+        for on_change, _ in self._subscribers:
+            try:
+                on_change(change)
+            except Exception as e:
+                print(f"Error handling change notification: {e}")
+
+    def _on_terminate(self, conn):
+        if not self._closing and (self._reconnect_task is None or self._reconnect_task.done()):
+            self._reconnect_task = asyncio.create_task(self._reconnect())
+
+    async def _reconnect(self):
+        while not self._closing:
+            await asyncio.sleep(self.reconnect_delay)
+            try:
+                await self.start()
+            except Exception as e:
+                print(f"Change feed reconnect failed: {e}")
+                continue
+
+            # anything written while we were disconnected was never delivered
+            for _, on_resync in self._subscribers:
+                if on_resync:
+                    on_resync()
+            return
@@ -0,0 +1,103 @@
+import asyncio
+import time
+from collections import namedtuple
+
+# bucket: rate-limit key, sends with the same key go out one at a time
+# send: zero-argument coroutine function returning True once the rows count as handled
+Delivery = namedtuple('Delivery', ['bucket', 'send', 'rows'])
+
+DeliveryStats = namedtuple('DeliveryStats', ['sent', 'failed', 'buckets', 'elapsed'])
+
+MESSAGE_LIMIT = 2000
+
+
+# Packs (line, rows) pairs into as few messages as fit under Discord's length limit,
+# yielding (content, rows) so each message carries the rows it covers
+def pack_lines(items, limit=MESSAGE_LIMIT):
+    content, rows = '', []
+    for line, line_rows in items:
+        line = line[:limit]
+        if content and len(content) + 1 + len(line) > limit:
+            yield content, rows
+            content, rows = '', []
+        content = f"{content}\n{line}" if content else line
+        rows = rows + list(line_rows)
+    if content:
+        yield content, rows
+
+
+def dm_bucket(uiud):
+    return ('dm', uiud)
+
+
+def channel_bucket(channel_id):
+    return ('channel', channel_id)
+
+
+# Token bucket shared by every send, keeps us under Discord's global request limit
+class RateLimiter:
+    def __init__(self, rate, per=1.0):
+        self.rate = rate
+        self.per = per
+        self._tokens = rate
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate / self.per)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+
+# Sends deliveries concurrently: one worker per bucket, at most `concurrency` in flight overall
+class DeliveryEngine:
+    def __init__(self, concurrency=8, global_rate=40):
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(global_rate)
+        self.last_stats = None
+
+    async def run(self, deliveries):
+        started = time.monotonic()
+        buckets = {}
+        for delivery in deliveries:
+            buckets.setdefault(delivery.bucket, []).append(delivery)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        handled = []
+        failed = 0
+
+        async def drain(queue):
+            nonlocal failed
+            for delivery in queue:
+                async with semaphore:
+                    await self.limiter.acquire()
+                    try:
+                        ok = await delivery.send()
+                    except Exception as e:
+                        print(f"Error delivering to {delivery.bucket}: {e}")
+                        ok = False
+                if ok:
+                    handled.extend(delivery.rows)
+                else:
+                    failed += 1
+
+        await asyncio.gather(*(drain(queue) for queue in buckets.values()))
+
+        self.last_stats = DeliveryStats(
+            sent=len(deliveries) - failed,
+            failed=failed,
+            buckets=len(buckets),
+            elapsed=time.monotonic() - started
+        )
+        if deliveries:
+            stats = self.last_stats
+            rate = stats.sent / stats.elapsed if stats.elapsed > 0 else float(stats.sent)
+            print(f"Delivered {stats.sent} message(s) across {stats.buckets} bucket(s) in {stats.elapsed:.2f}s "
+                  f"({rate:.1f}/s, {stats.failed} failed)")
+        return handled
@@ -0,0 +1,71 @@
+from cache import LRUCache
+
+
+# Read-through cache of event rows by eid and of guild-scoped listing queries. Writers
+# invalidate explicitly and the change feed covers writes made by other processes; the TTL
+# bounds how stale an entry can get if an invalidation is ever missed.
+class EventCache:
+    def __init__(self, db, maxsize=4096, ttl=300):
+        self.db = db
+        self.events = LRUCache(maxsize, ttl)
+        self.listings = LRUCache(maxsize, ttl)
+        # bumped per guild on invalidation, old listing entries become unreachable and age out
+        self._generations = {}
+        # bumped on any invalidation, a read that raced with a write is not cached
+        self._writes = 0
+
+    async def _read(self, cache, key, load):
+        value = cache.get(key)
+        if value is None:
+            writes = self._writes
+            value = await load()
+            if value is not None and writes == self._writes:
+                cache.set(key, value)
+        return value
+
+    async def get_event(self, eid):
+        return await self._read(self.events, eid, lambda: self.db.fetchrow('event_by_id', eid))
+
+    # Repository-like fetch/fetchval for one guild's listing queries, e.g. as a KeysetPager source
+    def guild(self, gid):
+        return GuildReads(self, gid)
+
+    def invalidate_event(self, eid, gid=None):
+        self._writes += 1
+        self.events.pop(eid)
+        if gid is not None:
+            self.invalidate_guild(gid)
+
+    def invalidate_guild(self, gid):
+        self._writes += 1
+        self._generations[gid] = self._generations.get(gid, 0) + 1
+
+    def clear(self):
+        self._writes += 1
+        self.events.clear()
+        self.listings.clear()
+
+    # change feed subscriber
+    def on_change(self, change):
+        if change.get('table') == 'event':
+            self.invalidate_event(change['eid'], change.get('gid'))
+
+    def stats(self):
+        return {'events': self.events.stats(), 'listings': self.listings.stats()}
+
+
+class GuildReads:
+    def __init__(self, cache, gid):
+        self.cache = cache
+        self.gid = gid
+
+    def _key(self, name, args):
+        return self.gid, self.cache._generations.get(self.gid, 0), name, args
+
+    async def fetch(self, name, *args):
+        return await self.cache._read(self.cache.listings, self._key(name, args),
+                                      lambda: self.cache.db.fetch(name, *args))
+
+    async def fetchval(self, name, *args):
+        return await self.cache._read(self.cache.listings, self._key(name, args),
+                                      lambda: self.cache.db.fetchval(name, *args))
@@ -0,0 +1,164 @@
+import asyncio
+import bisect
+from cache import LRUCache
+
+
+def terms(eid, name):
+    # the whole name, each word in it, and the id, so "standup", "weekly st" and "12" all match
+    name = name.lower()
+    return {name, str(eid), *name.split()}
+
+
+# Sorted (term, eid) keys over one scope's events, prefix search is a bisect plus a short walk
+class PrefixIndex:
+    def __init__(self, rows=()):
+        # eid -> (name, owner uiud or None when unknown)
+        self.events = {}
+        self._keys = []
+        for row in rows:
+            self.events[row['eid']] = (row['meetingname'], row['uiud'])
+        self._keys = sorted((term, eid) for eid, (name, _) in self.events.items() for term in terms(eid, name))
+
+    def add(self, eid, name, owner=None):
+        current = self.events.get(eid)
+        if current is not None:
+            if current[0] == name and (owner is None or current[1] == owner):
+                return
+            self.remove(eid)
+            owner = owner or current[1]
+        self.events[eid] = (name, owner)
+        for term in terms(eid, name):
+            bisect.insort(self._keys, (term, eid))
+
+    def remove(self, eid):
+        current = self.events.pop(eid, None)
+        if current is None:
+            return
+        for term in terms(eid, current[0]):
+            i = bisect.bisect_left(self._keys, (term, eid))
+            if i < len(self._keys) and self._keys[i] == (term, eid):
+                del self._keys[i]
+
+    # up to limit (eid, name) pairs with a term starting with prefix, newest events first when
+    # nothing has been typed yet
+    def search(self, prefix, limit=25, owner=None):
+        prefix = prefix.strip().lower()
+        found = {}
+        if not prefix:
+            candidates = sorted(self.events, reverse=True)
+        else:
+            candidates = []
+            for term, eid in self._keys[bisect.bisect_left(self._keys, (prefix,)):]:
+                if not term.startswith(prefix):
+                    break
+                candidates.append(eid)
+        for eid in candidates:
+            name, event_owner = self.events[eid]
+            if eid not in found and (owner is None or event_owner == owner):
+                found[eid] = name
+                if len(found) == limit:
+                    break
+        return list(found.items())
+
+
+# Per-guild and per-user PrefixIndexes for event-ID autocomplete. A scope is loaded with one
+# query the first time someone autocompletes in it and then kept current from the change feed,
+# so keystrokes never reach the database.
+class EventIndex:
+    def __init__(self, db, maxsize=1024):
+        self.db = db
+        # ('guild', gid) or ('user', uiud) -> PrefixIndex
+        self._scopes = LRUCache(maxsize)
+        # eid -> scope keys it was indexed under, for renames and deletes
+        self._scopes_of = {}
+        # scope key -> (load task, changes that arrived while it ran)
+        self._loading = {}
+
+    async def guild(self, gid):
+        return await self._get(('guild', gid), 'guild_event_names', gid)
+
+    async def user(self, uiud):
+        return await self._get(('user', str(uiud)), 'user_event_names', str(uiud))
+
+    async def _get(self, key, query, arg):
+        index = self._scopes.get(key)
+        if index is not None:
+            return index
+        if key not in self._loading:
+            self._loading[key] = (asyncio.create_task(self.db.fetch(query, arg)), [])
+        task, buffered = self._loading[key]
+        try:
+            rows = await asyncio.shield(task)
+        finally:
+            if task.done() and self._loading.get(key, (None,))[0] is task:
+                del self._loading[key]
+        index = self._scopes.peek(key)
+        if index is None:
+            index = PrefixIndex(rows)
+            self._scopes.set(key, index)
+            for eid in index.events:
+                self._scopes_of.setdefault(eid, set()).add(key)
+            for change in buffered:
+                self.on_change(change)
+        return index
+
+    def _scope(self, key):
+        return self._scopes.peek(key)
+
+    def _add(self, key, eid, name, owner=None):
+        index = self._scope(key)
+        if index is not None:
+            index.add(eid, name, owner)
+            self._scopes_of.setdefault(eid, set()).add(key)
+
+    def add_event(self, eid, gid, owner, name):
+        if gid:
+            self._add(('guild', gid), eid, name, owner)
+        # owners are always signed up to their own events
+        self._add(('user', owner), eid, name, owner)
+
+    def rename_event(self, eid, name):
+        for key in self._scopes_of.get(eid, ()):
+            index = self._scope(key)
+            if index is not None:
+                index.add(eid, name)
+
+    def remove_event(self, eid):
+        for key in self._scopes_of.pop(eid, ()):
+            index = self._scope(key)
+            if index is not None:
+                index.remove(eid)
+
+    def remove_signup(self, uiud, eid):
+        index = self._scope(('user', uiud))
+        if index is not None:
+            index.remove(eid)
+        keys = self._scopes_of.get(eid)
+        if keys:
+            keys.discard(('user', uiud))
+
+    def clear(self):
+        self._scopes.clear()
+        self._scopes_of.clear()
+
+    # change feed subscriber
+    def on_change(self, change):
+        for _, buffered in self._loading.values():
+            buffered.append(change)
+
+        eid, op = change['eid'], change['op']
+        if change.get('table') == 'event':
+            if op == 'INSERT':
+                self.add_event(eid, change.get('gid'), change.get('owner'), change['meetingname'])
+            elif op == 'UPDATE':
+                self.rename_event(eid, change['meetingname'])
+            else:
+                self.remove_event(eid)
+        elif change.get('table') == 'scheduled':
+            if op == 'DELETE':
+                self.remove_signup(change['uiud'], eid)
+            elif change.get('meetingname') is not None:
+                self._add(('user', change['uiud']), eid, change['meetingname'])
+
+    def stats(self):
+        return {'scopes': self._scopes.stats(), 'loading': len(self._loading)}
@@ -0,0 +1,99 @@
+import ast
+import asyncio
+import json
+import os
+import re
+import sys
+import asyncpg
+from dotenv import load_dotenv
+
+# Runs EXPLAIN on every static SQL statement in the bot's modules and fails if any plan
+# sequentially scans a table with more than EXPLAIN_MIN_ROWS rows.
+#
+#   python explain_check.py
+#
+# Plans are generic (plan_cache_mode = force_generic_plan), i.e. what a prepared statement
+# gets for arbitrary parameter values, so NULL placeholders can't fold the query away.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+SQL_PATTERN = re.compile(r"^(SELECT|INSERT|UPDATE|DELETE|WITH)\s")
+
+
+def find_queries(root=ROOT):
+    queries = []
+    for filename in sorted(os.listdir(root)):
+        if not filename.endswith('.py') or filename == os.path.basename(__file__):
+            continue
+        path = os.path.join(root, filename)
+        with open(path) as f:
+            tree = ast.parse(f.read(), filename)
+        # f-strings can't be explained, skip their pieces too
+        fragments = {id(part) for node in ast.walk(tree) if isinstance(node, ast.JoinedStr) for part in node.values}
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and id(node) not in fragments:
+                sql = node.value.strip()
+                if SQL_PATTERN.match(sql):
+                    queries.append((filename, node.lineno, sql))
+    queries.sort(key=lambda query: query[:2])
+    return [(f"{filename}:{lineno}", sql) for filename, lineno, sql in queries]
+
+
+def seq_scans(plan):
+    scans = []
+    if plan.get('Node Type') == 'Seq Scan':
+        scans.append(plan['Relation Name'])
+    for child in plan.get('Plans', []):
+        scans.extend(seq_scans(child))
+    return scans
+
+
+async def explain(conn, sql):
+    statement = await conn.prepare(sql)
+    params = ', '.join('NULL' for _ in statement.get_parameters())
+    async with conn.transaction():
+        await conn.execute("SET LOCAL plan_cache_mode = force_generic_plan")
+        await conn.execute(f"PREPARE explain_check AS {sql}")
+        try:
+            execute = f"EXECUTE explain_check({params})" if params else "EXECUTE explain_check"
+            result = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {execute}")
+        finally:
+            await conn.execute("DEALLOCATE explain_check")
+    return json.loads(result)[0]['Plan']
+
+
+async def main():
+    load_dotenv()
+    min_rows = int(os.getenv("EXPLAIN_MIN_ROWS", "10000"))
+    conn = await asyncpg.connect(
+        host=os.getenv("HOST"),
+        database=os.getenv("DATABASE"),
+        user=os.getenv("USER_NAME"),
+        password=os.getenv("PASSWORD")
+    )
+    try:
+        sizes = {row['relname']: row['reltuples'] for row in await conn.fetch(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")}
+
+        failures = 0
+        for location, sql in find_queries():
+            try:
+                plan = await explain(conn, sql)
+            except asyncpg.PostgresError as e:
+                print(f"ERROR {location}: {e}")
+                failures += 1
+                continue
+
+            large = [table for table in seq_scans(plan) if sizes.get(table, 0) > min_rows]
+            if large:
+                print(f"SEQ SCAN {location}: {', '.join(sorted(set(large)))}")
+                failures += 1
+            else:
+                print(f"ok {location}")
+    finally:
+        await conn.close()
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
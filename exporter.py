@@ -0,0 +1,168 @@
+import hashlib
+import hmac
+import os
+import tempfile
+from datetime import datetime
+from aiohttp import web
+
+PRODID = "-//discord-scheduler-bot//Events//EN"
+CHUNK_SIZE = 64 * 1024
+# spooled exports stay in memory up to this size, then move to disk
+SPOOL_BYTES = 1024 * 1024
+# scope -> (rows query, version query), both take the guild or user id
+FEED_SCOPES = {
+    'guild': ('export_server_events', 'server_events_version'),
+    'user': ('export_user_events', 'user_events_version'),
+}
+
+
+def ics_escape(text):
+    return text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def ics_time(utc_datetime):
+    return utc_datetime.strftime('%Y%m%dT%H%M%SZ')
+
+
+def fold(line, limit=75):
+    # content lines are at most 75 octets, continuations start with a space
+    if len(line.encode()) <= limit:
+        return line + '\r\n'
+    parts, current, size = [], '', 0
+    for char in line:
+        width = len(char.encode())
+        if size + width > limit:
+            parts.append(current)
+            current, size = ' ', 1
+        current += char
+        size += width
+    parts.append(current)
+    return '\r\n'.join(parts) + '\r\n'
+
+
+def ics_event(row, stamp):
+    lines = [
+        'BEGIN:VEVENT',
+        f"UID:event-{row['eid']}@discord-scheduler-bot",
+        f"DTSTAMP:{stamp}",
+        f"DTSTART:{ics_time(row['timestart'])}",
+        f"DTEND:{ics_time(row['timeend'])}",
+        f"SUMMARY:{ics_escape(row['meetingname'])}",
+    ]
+    if row['location']:
+        lines.append(f"LOCATION:{ics_escape(row['location'])}")
+    lines.append('END:VEVENT')
+    return ''.join(fold(line) for line in lines)
+
+
+# Turns an async iterator of event rows into .ics bytes, CHUNK_SIZE at a time, so only one
+# chunk is ever held no matter how many events there are
+async def stream_ics(rows, calendar_name):
+    stamp = ics_time(datetime.utcnow())
+    buffer = [fold(line) for line in (
+        'BEGIN:VCALENDAR', 'VERSION:2.0', f"PRODID:{PRODID}", 'CALSCALE:GREGORIAN',
+        f"X-WR-CALNAME:{ics_escape(calendar_name)}",
+    )]
+    size = 0
+    async for row in rows:
+        event = ics_event(row, stamp)
+        buffer.append(event)
+        size += len(event)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer).encode()
+            buffer, size = [], 0
+    buffer.append(fold('END:VCALENDAR'))
+    yield ''.join(buffer).encode()
+
+
+# Drains rows into spool as .ics and rewinds it. The cursor's connection is released as soon as
+# the rows are read, never held while a slow client downloads. False if the output passed limit.
+async def spool_ics(rows, calendar_name, spool, limit=None):
+    try:
+        async for chunk in stream_ics(rows, calendar_name):
+            spool.write(chunk)
+            if limit and spool.tell() > limit:
+                return False
+    finally:
+        await rows.aclose()
+    spool.seek(0)
+    return True
+
+
+def feed_token(secret, scope, key):
+    return hmac.new(secret.encode(), f"{scope}:{key}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+# Serves /calendar/{guild|user}/{id}.ics?token=... for calendar clients. Each response carries an
+# ETag from a version query, so unchanged calendars are answered with a 304 without exporting the
+# events. There's no Last-Modified: no timestamp moves when an event or sign-up is deleted.
+class CalendarFeed:
+    def __init__(self, db, secret, host='0.0.0.0', port=8080, base_url=None):
+        self.db = db
+        self.secret = secret
+        self.host = host
+        self.port = port
+        # the public address calendar clients reach the feed at, the bind address usually isn't
+        self.base_url = base_url.rstrip('/') if base_url else None
+        self._runner = None
+
+    @classmethod
+    def from_env(cls, db):
+        # FEED_PORT turns the feed on, FEED_SECRET signs the feed URLs
+        port = os.getenv("FEED_PORT")
+        if not port:
+            return None
+        secret = os.getenv("FEED_SECRET")
+        if not secret:
+            print("FEED_PORT is set but FEED_SECRET isn't, not serving calendar feeds.")
+            return None
+        base_url = os.getenv("FEED_BASE_URL")
+        if not base_url:
+            print("FEED_BASE_URL isn't set, calendar feed links won't be handed out.")
+        return cls(db, secret, os.getenv("FEED_HOST", "0.0.0.0"), int(port), base_url)
+
+    # None without a FEED_BASE_URL, there's no address to give out then
+    def url(self, scope, key):
+        if not self.base_url:
+            return None
+        return f"{self.base_url}/calendar/{scope}/{key}.ics?token={feed_token(self.secret, scope, key)}"
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/calendar/{scope}/{key}.ics', self.handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        print(f"Serving calendar feeds on {self.host}:{self.port}")
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    async def handle(self, request):
+        scope, key = request.match_info['scope'], request.match_info['key']
+        if scope not in FEED_SCOPES or not key.isdigit():
+            raise web.HTTPNotFound()
+        if not hmac.compare_digest(request.query.get('token', ''), feed_token(self.secret, scope, key)):
+            raise web.HTTPForbidden()
+
+        rows_query, version_query = FEED_SCOPES[scope]
+        # guild ids are BIGINT, user ids are stored as text
+        arg = int(key) if scope == 'guild' else key
+        etag = '"' + await self.db.fetchval(version_query, arg) + '"'
+
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            return web.Response(status=304, headers=headers)
+
+        with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as spool:
+            # the feed listens publicly, a stalled client must only ever hold a file, not a pooled connection
+            await spool_ics(self.db.cursor(rows_query, arg), f"Events ({scope} {key})", spool)
+            response = web.StreamResponse(headers=headers)
+            response.content_type = 'text/calendar'
+            response.charset = 'utf-8'
+            await response.prepare(request)
+            while chunk := spool.read(CHUNK_SIZE):
+                await response.write(chunk)
+        await response.write_eof()
+        return response
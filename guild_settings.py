@@ -0,0 +1,34 @@
+# Per-guild settings persisted in guild_settings, with the resolved reminder channel
+# cached until a channel or guild update invalidates it
+class GuildSettings:
+    def __init__(self):
+        self._reminder_channels = {}
+        self._resolved = {}
+
+    async def load(self, db):
+        rows = await db.fetch('guild_settings')
+        self._reminder_channels = {row['gid']: row['reminder_channel'] for row in rows}
+        self._resolved = {}
+
+    async def set_reminder_channel(self, db, guild_id, channel_id):
+        await db.execute('set_reminder_channel', guild_id, channel_id)
+        self._reminder_channels[guild_id] = channel_id
+        self.invalidate(guild_id)
+
+    def reminder_channel(self, guild):
+        if guild.id in self._resolved:
+            return self._resolved[guild.id]
+
+        channel = None
+        channel_id = self._reminder_channels.get(guild.id)
+        if channel_id:
+            channel = guild.get_channel(channel_id)
+        if channel is None:
+            # no usable configured channel: the system channel, else the first text channel
+            channel = guild.system_channel or next((x for x in guild.text_channels), None)
+
+        self._resolved[guild.id] = channel
+        return channel
+
+    def invalidate(self, guild_id):
+        self._resolved.pop(guild_id, None)
@@ -0,0 +1,175 @@
+import csv
+import io
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+import pytz
+from tz_convert import converter
+
+MAX_IMPORT_BYTES = 1024 * 1024
+MAX_IMPORT_EVENTS = 1000
+# same cap as the create commands
+MAX_NAME_LENGTH = 100
+CSV_COLUMNS = ('name', 'location', 'start_date', 'start_time', 'end_date', 'end_time')
+
+# start/end are naive UTC like everything stored in event
+ImportedEvent = namedtuple('ImportedEvent', ['line', 'name', 'location', 'start', 'end'])
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+def iter_lines(data):
+    # decodes lazily, one line at a time
+    return io.TextIOWrapper(io.BytesIO(data), encoding='utf-8-sig', newline='')
+
+
+def parse_csv(lines, timezone):
+    reader = csv.DictReader(lines)
+    if reader.fieldnames is None:
+        return
+    fields = [name.strip().lower() for name in reader.fieldnames]
+    missing = [column for column in CSV_COLUMNS if column not in fields]
+    if missing:
+        raise ImportFormatError(f"CSV is missing the column(s): {', '.join(missing)}")
+    reader.fieldnames = fields
+
+    for row in reader:
+        line = reader.line_num
+        try:
+            start = converter.parse_local(row['start_date'].strip(), row['start_time'].strip(), timezone)
+            end = converter.parse_local(row['end_date'].strip(), row['end_time'].strip(), timezone)
+        except (ValueError, AttributeError):
+            yield line, None, "dates must be YYYY-MM-DD and times HH:MM:SS"
+            continue
+        yield line, ImportedEvent(line, (row['name'] or '').strip(), (row['location'] or '').strip(), start, end), None
+
+
+def unfold(lines):
+    # RFC 5545 content lines: a line starting with a space or tab continues the previous one
+    current, start = None, 0
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t') and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield start, current
+        current, start = line, number
+    if current is not None:
+        yield start, current
+
+
+def unescape(value):
+    return value.replace('\\n', '\n').replace('\\N', '\n').replace('\\,', ',').replace('\\;', ';').replace('\\\\', '\\')
+
+
+def parse_property(line):
+    name_params, _, value = line.partition(':')
+    name, *params = name_params.split(';')
+    return name.upper(), dict(param.split('=', 1) for param in params if '=' in param), value
+
+
+# DTSTART/DTEND -> (naive UTC, is a whole day)
+def parse_ics_time(params, value, timezone):
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        day = datetime.strptime(value, '%Y%m%d')
+        return converter.to_utc(day, timezone), True
+    if value.endswith('Z'):
+        return datetime.strptime(value, '%Y%m%dT%H%M%SZ'), False
+    tzid = params.get('TZID', timezone).strip('"')
+    if tzid not in pytz.all_timezones_set:
+        raise ValueError(f"unknown TZID {tzid}")
+    return converter.to_utc(datetime.strptime(value, '%Y%m%dT%H%M%S'), tzid), False
+
+
+# RFC 5545 DURATION, e.g. PT1H30M, P1D, P2W
+DURATION_PATTERN = re.compile(r"^([+-])?P(?:(\d+)W|(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?)$")
+
+
+def parse_duration(value):
+    match = DURATION_PATTERN.match(value)
+    if not match or value.endswith(('P', 'T')):
+        raise ValueError(f"bad DURATION {value}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def parse_ics(lines, timezone):
+    event = None
+    for line, content in unfold(lines):
+        name, params, value = parse_property(content)
+        if name == 'BEGIN' and value.upper() == 'VEVENT':
+            event = {'line': line}
+        elif name == 'END' and value.upper() == 'VEVENT' and event is not None:
+            yield event['line'], *_ics_event(event)
+            event = None
+        elif event is not None and name in ('SUMMARY', 'LOCATION'):
+            event[name] = unescape(value).strip()
+        elif event is not None and name in ('DTSTART', 'DTEND'):
+            try:
+                event[name] = parse_ics_time(params, value.strip(), timezone)
+            except ValueError as e:
+                event['error'] = f"{name}: {e}"
+        elif event is not None and name == 'DURATION':
+            try:
+                event[name] = parse_duration(value.strip())
+            except ValueError as e:
+                event['error'] = str(e)
+
+
+def _ics_event(event):
+    if 'error' in event:
+        return None, event['error']
+    if 'DTSTART' not in event:
+        return None, "missing DTSTART"
+    start, all_day = event['DTSTART']
+    if 'DTEND' in event:
+        end = event['DTEND'][0]
+    elif 'DURATION' in event:
+        end = start + event['DURATION']
+    elif all_day:
+        end = start + timedelta(days=1)
+    else:
+        return None, "missing DTEND or DURATION"
+    return ImportedEvent(event['line'], event.get('SUMMARY', ''), event.get('LOCATION', ''), start, end), None
+
+
+# Parses an .ics or .csv attachment into events, interpreting times without a zone in
+# timezone. Returns (events, errors) with errors as "line N: reason" strings.
+def load_events(filename, data, timezone, now=None, limit=MAX_IMPORT_EVENTS):
+    if len(data) > MAX_IMPORT_BYTES:
+        raise ImportFormatError(f"Files can be at most {MAX_IMPORT_BYTES // 1024} KB.")
+    extension = filename.lower().rsplit('.', 1)[-1]
+    if extension == 'ics':
+        rows = parse_ics(iter_lines(data), timezone)
+    elif extension == 'csv':
+        rows = parse_csv(iter_lines(data), timezone)
+    else:
+        raise ImportFormatError("Only .ics and .csv files can be imported.")
+
+    now = now or datetime.utcnow()
+    events, errors = [], []
+    try:
+        for line, event, error in rows:
+            if event is not None:
+                if not event.name:
+                    error = "missing a name"
+                elif len(event.name) > MAX_NAME_LENGTH:
+                    error = f"name is longer than {MAX_NAME_LENGTH} characters"
+                elif event.end <= event.start:
+                    error = "ends before it starts"
+                elif event.end <= now:
+                    error = "has already ended"
+            if error:
+                errors.append(f"line {line}: {error}")
+                continue
+            events.append(event)
+            if len(events) > limit:
+                raise ImportFormatError(f"At most {limit} events can be imported at once.")
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise ImportFormatError(f"Could not read the file: {e}")
+    return events, errors
@@ -0,0 +1,51 @@
+import os
+import re
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE_PATTERN = re.compile(r"^(\d+)_(\w+)\.sql$")
+# key for the advisory lock that keeps two bot processes from migrating at once
+MIGRATION_LOCK = 0x6d696772
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = []
+    for filename in os.listdir(directory):
+        match = MIGRATION_FILE_PATTERN.match(filename)
+        if match:
+            migrations.append((int(match.group(1)), match.group(2), os.path.join(directory, filename)))
+    migrations.sort()
+
+    versions = [version for version, _, _ in migrations]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions in {directory}")
+    return migrations
+
+
+# Applies every migration that hasn't been recorded in schema_migrations, in version order,
+# inside one transaction. Returns the versions that were applied.
+async def migrate(conn, directory=MIGRATIONS_DIR):
+    await conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+        )
+        """
+    )
+
+    applied_now = []
+    async with conn.transaction():
+        await conn.execute("SELECT pg_advisory_xact_lock($1)", MIGRATION_LOCK)
+        applied = {row['version'] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+        for version, name, path in load_migrations(directory):
+            if version in applied:
+                continue
+            with open(path) as f:
+                await conn.execute(f.read())
+            await conn.execute("INSERT INTO schema_migrations (version, name) VALUES ($1, $2)", version, name)
+            print(f"Applied migration {version:04d}_{name}")
+            applied_now.append(version)
+
+    return applied_now
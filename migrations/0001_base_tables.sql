@@ -0,0 +1,24 @@
+-- Tables the bot was originally run against. IF NOT EXISTS lets databases that were
+-- set up by hand adopt the migration history without changes.
+CREATE TABLE IF NOT EXISTS "user" (
+    uiud TEXT PRIMARY KEY,
+    name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS event (
+    eid SERIAL PRIMARY KEY,
+    uiud TEXT NOT NULL,
+    gid BIGINT,
+    meetingname TEXT NOT NULL,
+    location TEXT,
+    timestart TIMESTAMP NOT NULL,
+    timeend TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS scheduled (
+    uiud TEXT NOT NULL,
+    eid INT NOT NULL REFERENCES event (eid),
+    status TEXT,
+    notification INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (uiud, eid)
+);
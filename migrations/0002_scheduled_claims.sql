@@ -0,0 +1 @@
+ALTER TABLE scheduled ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMP;
@@ -0,0 +1,62 @@
+CREATE OR REPLACE FUNCTION notify_event_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    old_start TIMESTAMP;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        old_start := OLD.timestart;
+    END IF;
+    PERFORM pg_notify('event_changes', json_build_object(
+        'table', 'event',
+        'op', TG_OP,
+        'eid', rec.eid,
+        'gid', rec.gid,
+        'meetingname', rec.meetingname,
+        'timestart', rec.timestart,
+        'timeend', rec.timeend,
+        'old_timestart', old_start
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_scheduled_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    ev RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    SELECT gid, meetingname, timestart, timeend INTO ev FROM event WHERE eid = rec.eid;
+    PERFORM pg_notify('event_changes', json_build_object(
+        'table', 'scheduled',
+        'op', TG_OP,
+        'eid', rec.eid,
+        'uiud', rec.uiud,
+        'notification', rec.notification,
+        'gid', ev.gid,
+        'meetingname', ev.meetingname,
+        'timestart', ev.timestart,
+        'timeend', ev.timeend
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS event_change_notify ON event;
+CREATE TRIGGER event_change_notify
+    AFTER INSERT OR UPDATE OR DELETE ON event
+    FOR EACH ROW EXECUTE PROCEDURE notify_event_change();
+
+DROP TRIGGER IF EXISTS scheduled_change_notify ON scheduled;
+CREATE TRIGGER scheduled_change_notify
+    AFTER INSERT OR UPDATE OR DELETE ON scheduled
+    FOR EACH ROW EXECUTE PROCEDURE notify_scheduled_change();
@@ -0,0 +1 @@
+ALTER TABLE event ADD COLUMN IF NOT EXISTS role_id BIGINT;
@@ -0,0 +1,4 @@
+CREATE TABLE IF NOT EXISTS guild_settings (
+    gid BIGINT PRIMARY KEY,
+    reminder_channel BIGINT
+);
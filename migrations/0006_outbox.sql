@@ -0,0 +1,13 @@
+CREATE TABLE IF NOT EXISTS outbox (
+    id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    idempotency_key TEXT UNIQUE,
+    attempts INT NOT NULL DEFAULT 0,
+    available_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+    claimed_at TIMESTAMP,
+    last_error TEXT,
+    dead BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+);
+CREATE INDEX IF NOT EXISTS outbox_ready_idx ON outbox (available_at) WHERE NOT dead;
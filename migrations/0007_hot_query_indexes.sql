@@ -0,0 +1,12 @@
+-- reminder horizon refill and claims: event.timestart range scans
+CREATE INDEX IF NOT EXISTS event_timestart_idx ON event (timestart);
+-- cleanup
+CREATE INDEX IF NOT EXISTS event_timeend_idx ON event (timeend);
+-- list_server_events and guild-scoped lookups
+CREATE INDEX IF NOT EXISTS event_gid_idx ON event (gid);
+-- show_events, delete_event and modify_event ownership checks
+CREATE INDEX IF NOT EXISTS event_uiud_idx ON event (uiud);
+-- joins and deletes by event; the primary key only covers lookups that lead with uiud
+CREATE INDEX IF NOT EXISTS scheduled_eid_idx ON scheduled (eid);
+-- reminders that still have to go out (pending or claimed), a small fraction of the table
+CREATE INDEX IF NOT EXISTS scheduled_unsent_idx ON scheduled (eid) WHERE notification <> 1;
@@ -0,0 +1,65 @@
+-- Partition an event belongs to when the bot runs as several sharded processes: guild events
+-- follow Discord's shard formula for their guild, private events are split by creator id.
+-- Mirrored by sharding.Partition.partition_of.
+CREATE OR REPLACE FUNCTION event_partition(gid BIGINT, uiud TEXT, shard_count INT) RETURNS INT AS $$
+    SELECT CASE
+        WHEN gid IS NOT NULL THEN ((gid >> 22) % shard_count)::INT
+        ELSE ((uiud::BIGINT >> 22) % shard_count)::INT
+    END
+$$ LANGUAGE sql IMMUTABLE;
+
+-- change notifications carry the event owner so each process can tell which partition they belong to
+CREATE OR REPLACE FUNCTION notify_event_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    old_start TIMESTAMP;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        old_start := OLD.timestart;
+    END IF;
+    PERFORM pg_notify('event_changes', json_build_object(
+        'table', 'event',
+        'op', TG_OP,
+        'eid', rec.eid,
+        'gid', rec.gid,
+        'owner', rec.uiud,
+        'meetingname', rec.meetingname,
+        'timestart', rec.timestart,
+        'timeend', rec.timeend,
+        'old_timestart', old_start
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_scheduled_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    ev RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    SELECT uiud, gid, meetingname, timestart, timeend INTO ev FROM event WHERE eid = rec.eid;
+    PERFORM pg_notify('event_changes', json_build_object(
+        'table', 'scheduled',
+        'op', TG_OP,
+        'eid', rec.eid,
+        'uiud', rec.uiud,
+        'notification', rec.notification,
+        'gid', ev.gid,
+        'owner', ev.uiud,
+        'meetingname', ev.meetingname,
+        'timestart', ev.timestart,
+        'timeend', ev.timeend
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
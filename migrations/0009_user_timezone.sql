@@ -0,0 +1,2 @@
+-- IANA zone name chosen with /set_timezone, NULL means the bot's default zone
+ALTER TABLE "user" ADD COLUMN IF NOT EXISTS timezone TEXT;
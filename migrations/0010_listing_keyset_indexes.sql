@@ -0,0 +1,5 @@
+-- keyset pagination of list_server_events on (timestart, eid); also covers every lookup event_gid_idx did
+CREATE INDEX IF NOT EXISTS event_gid_timestart_idx ON event (gid, timestart, eid);
+DROP INDEX IF EXISTS event_gid_idx;
+-- keyset pagination of the private half of show_events
+CREATE INDEX IF NOT EXISTS event_private_timestart_idx ON event (uiud, timestart, eid) WHERE gid IS NULL;
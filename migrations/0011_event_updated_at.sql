@@ -0,0 +1,14 @@
+-- when an event last changed, for calendar feed ETag/Last-Modified
+ALTER TABLE event ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP NOT NULL DEFAULT (now() AT TIME ZONE 'utc');
+
+CREATE OR REPLACE FUNCTION touch_event_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now() AT TIME ZONE 'utc';
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS event_touch_updated_at ON event;
+CREATE TRIGGER event_touch_updated_at
+    BEFORE UPDATE ON event
+    FOR EACH ROW EXECUTE PROCEDURE touch_event_updated_at();
@@ -0,0 +1,6 @@
+-- a recurring event is one row holding its next occurrence; cleanup moves it along the series
+-- instead of deleting it. recur_tz is the creator's zone, steps are taken on that wall clock.
+ALTER TABLE event ADD COLUMN IF NOT EXISTS recurrence TEXT
+    CHECK (recurrence IN ('daily', 'weekly', 'monthly'));
+ALTER TABLE event ADD COLUMN IF NOT EXISTS recur_until TIMESTAMP;
+ALTER TABLE event ADD COLUMN IF NOT EXISTS recur_tz TEXT;
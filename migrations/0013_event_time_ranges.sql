@@ -0,0 +1,5 @@
+-- overlap searches (conflict warnings, /find_slot) use range && range against this index.
+-- greatest() keeps rows whose end was entered before their start from breaking tsrange.
+CREATE INDEX IF NOT EXISTS event_time_range_idx ON event USING gist (tsrange(timestart, greatest(timeend, timestart)));
+-- recurring events can overlap a window their stored occurrence doesn't, they're checked separately
+CREATE INDEX IF NOT EXISTS event_recurring_timestart_idx ON event (timestart) WHERE recurrence IS NOT NULL;
@@ -0,0 +1,56 @@
+-- pg_notify payloads must stay under 8000 bytes or the statement that fired the trigger fails,
+-- so names are cut to 100 characters; subscribers that need the full name read it from event.
+CREATE OR REPLACE FUNCTION notify_event_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    old_start TIMESTAMP;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    IF TG_OP = 'UPDATE' THEN
+        old_start := OLD.timestart;
+    END IF;
+    PERFORM pg_notify('event_changes', json_build_object(
+        'table', 'event',
+        'op', TG_OP,
+        'eid', rec.eid,
+        'gid', rec.gid,
+        'owner', rec.uiud,
+        'meetingname', left(rec.meetingname, 100),
+        'timestart', rec.timestart,
+        'timeend', rec.timeend,
+        'old_timestart', old_start
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_scheduled_change() RETURNS trigger AS $$
+DECLARE
+    rec RECORD;
+    ev RECORD;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        rec := OLD;
+    ELSE
+        rec := NEW;
+    END IF;
+    SELECT uiud, gid, meetingname, timestart, timeend INTO ev FROM event WHERE eid = rec.eid;
+    PERFORM pg_notify('event_changes', json_build_object(
+        'table', 'scheduled',
+        'op', TG_OP,
+        'eid', rec.eid,
+        'uiud', rec.uiud,
+        'notification', rec.notification,
+        'gid', ev.gid,
+        'owner', ev.uiud,
+        'meetingname', left(ev.meetingname, 100),
+        'timestart', ev.timestart,
+        'timeend', ev.timeend
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
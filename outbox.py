@@ -0,0 +1,158 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+
+# Raised by a handler when retrying can't help, the message goes straight to the dead letters
+class PermanentError(Exception):
+    pass
+
+
+# Queues side effects inside the caller's transaction, so they exist exactly when the
+# DB change they belong to commits. Messages with a key that is already queued are dropped.
+async def enqueue(conn, kind, payload, key=None):
+    await conn.execute(
+        """
+        INSERT INTO outbox (kind, payload, idempotency_key) VALUES ($1, $2, $3)
+        ON CONFLICT (idempotency_key) DO NOTHING
+        """,
+        kind, json.dumps(payload), key
+    )
+
+
+async def enqueue_many(conn, kind, items):
+    if items:
+        await conn.executemany(
+            """
+            INSERT INTO outbox (kind, payload, idempotency_key) VALUES ($1, $2, $3)
+            ON CONFLICT (idempotency_key) DO NOTHING
+            """,
+            [(kind, json.dumps(payload), key) for payload, key in items]
+        )
+
+
+# Drains the outbox with a pool of concurrent handlers. Failures are retried with exponential
+# backoff until max_attempts, then kept as dead letters for inspection.
+class OutboxWorker:
+    def __init__(self, pool, handlers, partition, concurrency=4, batch_size=50, poll_interval=10,
+                 base_delay=5, max_delay=3600, max_attempts=8, claim_lease=timedelta(minutes=5)):
+        self.pool = pool
+        # messages carry a gid, only the process whose shard has that guild can act on them
+        self.partition = partition
+        # kind -> async callable taking the decoded payload
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+        self.claim_lease = claim_lease
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    # Called after committing an enqueue so the message doesn't wait for the next poll
+    def wake(self):
+        self._wakeup.set()
+
+    async def _claim(self):
+        now = datetime.utcnow()
+        async with self.pool.acquire() as conn:
+            return await conn.fetch(
+                """
+                UPDATE outbox
+                SET claimed_at = $1, attempts = attempts + 1
+                WHERE id IN (
+                    SELECT id FROM outbox
+                    WHERE NOT dead
+                    AND available_at <= $1
+                    AND (claimed_at IS NULL OR claimed_at < $2)
+                    AND event_partition((payload->>'gid')::bigint, NULL, $4) = ANY($5::int[])
+                    ORDER BY id
+                    LIMIT $3
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, kind, payload, attempts
+                """,
+                now, now - self.claim_lease, self.batch_size, *self.partition.sql_args()
+            )
+
+    async def _handle(self, message):
+        handler = self.handlers.get(message['kind'])
+        if handler is None:
+            raise PermanentError(f"no handler for outbox kind '{message['kind']}'")
+        await handler(json.loads(message['payload']))
+
+    async def _process(self, messages):
+        # messages about the same event run in order, everything else runs concurrently
+        groups = {}
+        for message in sorted(messages, key=lambda m: m['id']):
+            payload = json.loads(message['payload'])
+            groups.setdefault((payload.get('gid'), payload.get('eid')), []).append(message)
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        done, retry, dead = [], [], []
+
+        async def drain(group):
+            for message in group:
+                async with semaphore:
+                    try:
+                        await self._handle(message)
+                    except PermanentError as e:
+                        dead.append((message['id'], str(e)))
+                        continue
+                    except Exception as e:
+                        if message['attempts'] >= self.max_attempts:
+                            dead.append((message['id'], str(e)))
+                        else:
+                            delay = min(self.base_delay * 2 ** (message['attempts'] - 1), self.max_delay)
+                            retry.append((message['id'], str(e), timedelta(seconds=delay)))
+                        continue
+                done.append(message['id'])
+
+        await asyncio.gather(*(drain(group) for group in groups.values()))
+
+        now = datetime.utcnow()
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                if done:
+                    await conn.execute("DELETE FROM outbox WHERE id = ANY($1::bigint[])", done)
+                if retry:
+                    await conn.executemany(
+                        "UPDATE outbox SET claimed_at = NULL, last_error = $2, available_at = $3 WHERE id = $1",
+                        [(message_id, error, now + delay) for message_id, error, delay in retry]
+                    )
+                if dead:
+                    await conn.executemany(
+                        "UPDATE outbox SET claimed_at = NULL, last_error = $2, dead = TRUE WHERE id = $1",
+                        dead
+                    )
+
+        for message_id, error in dead:
+            print(f"Outbox message {message_id} moved to dead letters: {error}")
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                messages = await self._claim()
+                if messages:
+                    await self._process(messages)
+                    if len(messages) == self.batch_size:
+                        continue
+            except Exception as e:
+                print(f"Error draining outbox: {e}")
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,120 @@
+import asyncio
+from datetime import datetime
+
+# keyset for the first page, sorts before every stored (timestart, eid)
+FIRST_KEY = (datetime.min, 0)
+
+
+def page_key(row):
+    return row['timestart'], row['eid']
+
+
+# Walks one listing query a page at a time, ordered by (timestart, eid). Only the current page
+# and the prefetched next one are held, however many rows match.
+#
+# source runs named queries with fetch/fetchval, the Repository or a cache in front of it.
+# after_query/before_query take the listing's own arguments followed by the key
+# (timestart, eid) and the page size; before_query returns rows in descending order.
+# count_query takes the listing's arguments and returns the number of matching rows.
+class KeysetPager:
+    def __init__(self, source, after_query, before_query, count_query, args, page_size=4):
+        self.source = source
+        self.after_query = after_query
+        self.before_query = before_query
+        self.count_query = count_query
+        self.args = args
+        self.page_size = page_size
+        self.rows = []
+        self.index = 0
+        self.total = 0
+        self._prefetched = None
+
+    @property
+    def total_pages(self):
+        return max(1, -(-self.total // self.page_size))
+
+    @property
+    def has_previous(self):
+        return self.index > 0
+
+    @property
+    def has_next(self):
+        return len(self.rows) == self.page_size and self.index < self.total_pages - 1
+
+    async def open(self):
+        self.total = await self.source.fetchval(self.count_query, *self.args)
+        self.rows = await self.source.fetch(self.after_query, *self.args, *FIRST_KEY, self.page_size) if self.total else []
+        self.index = 0
+        self._prefetch()
+        return self.rows
+
+    async def next(self):
+        if not self.has_next:
+            return None
+        key = page_key(self.rows[-1])
+        rows = None
+        if self._prefetched and self._prefetched[0] == key:
+            try:
+                rows = await self._prefetched[1]
+            except Exception as e:
+                print(f"Error prefetching listing page: {e}")
+        self._prefetched = None
+        if rows is None:
+            rows = await self._fetch(self.after_query, key)
+        if not rows:
+            # rows were deleted since the count, stay on the last page there is
+            self.total = (self.index + 1) * self.page_size
+            return None
+        self.rows = rows
+        self.index += 1
+        self._prefetch()
+        return rows
+
+    async def previous(self):
+        if not self.has_previous:
+            return None
+        self._cancel_prefetch()
+        rows = await self._fetch(self.before_query, page_key(self.rows[0]))
+        if not rows:
+            self.index = 0
+            return None
+        self.rows = rows[::-1]
+        self.index -= 1
+        self._prefetch()
+        return self.rows
+
+    # moves straight to a page whose rows the caller still has, e.g. from a render cache
+    def seek(self, index, rows):
+        self.rows = rows
+        self.index = index
+        self._prefetch()
+
+    # the prefetched next page without moving to it, None if there is none or it failed
+    async def peek_next(self):
+        if not self._prefetched:
+            return None
+        try:
+            return await self._prefetched[1]
+        except (Exception, asyncio.CancelledError):
+            return None
+
+    async def _fetch(self, query, key):
+        return await self.source.fetch(query, *self.args, *key, self.page_size)
+
+    def _prefetch(self):
+        # fetch the next page while the user reads this one
+        self._cancel_prefetch()
+        if self.has_next:
+            key = page_key(self.rows[-1])
+            self._prefetched = (key, asyncio.create_task(self._fetch(self.after_query, key)))
+
+    def _cancel_prefetch(self):
+        if self._prefetched:
+            task = self._prefetched[1]
+            task.cancel()
+            # the task's result or error is not needed
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._prefetched = None
+
+    def close(self):
+        self._cancel_prefetch()
@@ -0,0 +1,42 @@
+import pytz
+import tzlocal
+from cache import LRUCache
+
+# cached for users without a row or without a timezone, so they don't hit the DB every time
+_NO_PROFILE = ''
+
+
+# Per-user timezone, loaded from "user".timezone on first use and cached by uiud. /set_timezone
+# clears the entry in its own process; the TTL bounds how long other processes keep the old zone.
+class TimezoneProfiles:
+    def __init__(self, db, maxsize=4096, ttl=300):
+        self.db = db
+        self._cache = LRUCache(maxsize, ttl)
+        self._default = None
+
+    def default(self):
+        # the bot host's zone, what every render used before profiles existed; UTC when the host
+        # zone has no IANA name pytz knows
+        if self._default is None:
+            try:
+                name = tzlocal.get_localzone_name()
+            except Exception:
+                name = None
+            self._default = name if name in pytz.all_timezones_set else 'UTC'
+        return self._default
+
+    async def get(self, uiud):
+        uiud = str(uiud)
+        timezone = self._cache.get(uiud)
+        if timezone is None:
+            timezone = await self.db.fetchval('user_timezone', uiud) or _NO_PROFILE
+            self._cache.set(uiud, timezone)
+        return timezone or self.default()
+
+    async def set(self, uiud, user_name, timezone):
+        uiud = str(uiud)
+        await self.db.execute('set_user_timezone', uiud, user_name, timezone)
+        self._cache.pop(uiud)
+
+    def stats(self):
+        return self._cache.stats()
@@ -0,0 +1,85 @@
+import calendar
+from datetime import timedelta
+from tz_convert import converter
+
+# event.recurrence values, mirrored by the CHECK constraint in migrations/0012
+RULES = ('daily', 'weekly', 'monthly')
+# a series never expands further than this, whatever its end date
+MAX_OCCURRENCES = 1000
+
+
+def _add_months(local_datetime, months):
+    month = local_datetime.month - 1 + months
+    year, month = local_datetime.year + month // 12, month % 12 + 1
+    if local_datetime.day > calendar.monthrange(year, month)[1]:
+        # like RRULE's BYMONTHDAY, months without that day are skipped
+        return None
+    return local_datetime.replace(year=year, month=month)
+
+
+def _shift(local_datetime, rule, n):
+    if rule == 'daily':
+        return local_datetime + timedelta(days=n)
+    if rule == 'weekly':
+        return local_datetime + timedelta(weeks=n)
+    return _add_months(local_datetime, n)
+
+
+# Yields (start, end) as naive UTC for the occurrences after the one stored on the row.
+# Steps are taken on the creator's wall clock, so a weekly 10:00 meeting stays at 10:00
+# across DST changes.
+def following(row):
+    rule, tz_name = row['recurrence'], row['recur_tz']
+    if rule not in RULES:
+        return
+    start = converter.from_utc(row['timestart'], tz_name).replace(tzinfo=None)
+    length = converter.from_utc(row['timeend'], tz_name).replace(tzinfo=None) - start
+    for n in range(1, MAX_OCCURRENCES + 1):
+        local_start = _shift(start, rule, n)
+        if local_start is None:
+            continue
+        next_start = converter.to_utc(local_start, tz_name)
+        if row['recur_until'] and next_start > row['recur_until']:
+            return
+        yield next_start, converter.to_utc(local_start + length, tz_name)
+
+
+# The first occurrence still running or upcoming at now, None once the series is over
+def next_occurrence(row, now):
+    for start, end in following(row):
+        if end > now:
+            return start, end
+    return None
+
+
+def upcoming(row, count):
+    occurrences = []
+    for occurrence in following(row):
+        occurrences.append(occurrence)
+        if len(occurrences) == count:
+            break
+    return occurrences
+
+
+# "Repeats weekly, then 05-12-2024, 05-19-2024, 05-26-2024" for listings, expanded per page
+def describe(row, tz_name, count=3):
+    if not row['recurrence']:
+        return ""
+    dates = [converter.format_date(converter.from_utc(start, tz_name)) for start, _ in upcoming(row, count)]
+    text = f"🔁 Repeats {row['recurrence']}"
+    if row['recur_until']:
+        text += f" until {converter.format_date(converter.from_utc(row['recur_until'], tz_name))}"
+    if dates:
+        text += ", then " + ", ".join(dates)
+    return text
+
+
+# Every occurrence, the stored one included, that overlaps [start, end)
+def overlapping(row, start, end):
+    occurrences = [(row['timestart'], row['timeend'])]
+    if row['recurrence']:
+        for occurrence in following(row):
+            if occurrence[0] >= end:
+                break
+            occurrences.append(occurrence)
+    return [(busy_start, busy_end) for busy_start, busy_end in occurrences if busy_start < end and busy_end > start]
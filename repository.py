@@ -0,0 +1,377 @@
+import os
+import time
+from contextlib import asynccontextmanager
+import asyncpg
+from outbox import enqueue, enqueue_many
+from recurrence import next_occurrence
+
+# Every query the commands, views and loops run, by name. The text of each one never changes,
+# so asyncpg prepares it once per connection and reuses it from the statement cache.
+# The scheduler, outbox, migrations and partition locks keep their own queries next to the
+# locking they implement.
+QUERIES = {
+    # events
+    'event_by_id': "SELECT eid, uiud, gid, meetingname, location, timestart, timeend FROM event WHERE eid = $1",
+    'owned_event': """
+        SELECT eid, uiud, gid, meetingname, location, timestart, timeend FROM event
+        WHERE eid = $1 AND uiud = $2
+    """,
+    'insert_event': """
+        INSERT INTO event (uiud, gid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz)
+        VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9) RETURNING eid
+    """,
+    # NULL leaves a column as it is
+    'update_event': """
+        UPDATE event SET
+            meetingname = COALESCE($3, meetingname),
+            location = COALESCE($4, location),
+            timestart = COALESCE($5, timestart),
+            timeend = COALESCE($6, timeend)
+        WHERE eid = $1 AND uiud = $2
+    """,
+    # bulk import: one statement for the whole batch
+    'insert_events': """
+        INSERT INTO event (uiud, gid, meetingname, location, timestart, timeend)
+        SELECT $1, $2, imported.name, imported.location, imported.timestart, imported.timeend
+        FROM unnest($3::text[], $4::text[], $5::timestamp[], $6::timestamp[])
+            WITH ORDINALITY AS imported (name, location, timestart, timeend, position)
+        ORDER BY imported.position
+        RETURNING eid
+    """,
+    'delete_event': "DELETE FROM event WHERE eid = $1 RETURNING role_id",
+    'delete_event_signups': "DELETE FROM scheduled WHERE eid = $1",
+    'set_role_id': "UPDATE event SET role_id = $1 WHERE eid = $2",
+    'role_links': "SELECT eid, gid, role_id FROM event WHERE role_id IS NOT NULL AND gid IS NOT NULL",
+    'link_role_by_name': "UPDATE event SET role_id = $1 WHERE eid = $2 AND gid = $3 AND role_id IS NULL",
+
+    # cleanup: ended events whose reminders went out, or that are past the grace period anyway
+    'lock_ended_events': """
+        SELECT e.eid, e.gid, e.role_id, e.timestart, e.timeend, e.recurrence, e.recur_until, e.recur_tz
+        FROM event e
+        WHERE e.timeend <= $1
+        AND (e.timeend <= $2 OR NOT EXISTS (
+            SELECT 1 FROM scheduled s WHERE s.eid = e.eid AND s.notification <> 1
+        ))
+        AND event_partition(e.gid, e.uiud, $3) = ANY($4::int[])
+        FOR UPDATE OF e SKIP LOCKED
+    """,
+    'delete_signups_of_events': "DELETE FROM scheduled WHERE eid = ANY($1::int[])",
+    'delete_events': "DELETE FROM event WHERE eid = ANY($1::int[])",
+    # recurring events move on to their next occurrence and their sign-ups get reminded again
+    'advance_events': """
+        UPDATE event e SET timestart = n.timestart, timeend = n.timeend
+        FROM unnest($1::int[], $2::timestamp[], $3::timestamp[]) AS n(eid, timestart, timeend)
+        WHERE e.eid = n.eid
+    """,
+    'reset_signups_of_events': """
+        UPDATE scheduled SET notification = 0, claimed_at = NULL WHERE eid = ANY($1::int[])
+    """,
+
+    # signups
+    'insert_signup': """
+        INSERT INTO scheduled (uiud, eid, status, notification) VALUES ($1, $2, 'Yes', $3)
+        ON CONFLICT (uiud, eid) DO NOTHING
+        RETURNING eid
+    """,
+    'delete_signup': "DELETE FROM scheduled WHERE uiud = $1 AND eid = $2 RETURNING eid",
+
+    # users
+    'ensure_user': "INSERT INTO \"user\" (uiud, name) VALUES ($1, $2) ON CONFLICT (uiud) DO NOTHING",
+    'user_timezone': "SELECT timezone FROM \"user\" WHERE uiud = $1",
+    'set_user_timezone': """
+        INSERT INTO "user" (uiud, name, timezone) VALUES ($1, $2, $3)
+        ON CONFLICT (uiud) DO UPDATE SET timezone = EXCLUDED.timezone
+    """,
+
+    # guild settings
+    'guild_settings': "SELECT gid, reminder_channel FROM guild_settings",
+    'set_reminder_channel': """
+        INSERT INTO guild_settings (gid, reminder_channel) VALUES ($1, $2)
+        ON CONFLICT (gid) DO UPDATE SET reminder_channel = EXCLUDED.reminder_channel
+    """,
+
+    # listings, paged by KeysetPager on (timestart, eid)
+    'server_events_after': """
+        SELECT eid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz FROM event
+        WHERE gid = $1 AND (timestart, eid) > ($2, $3)
+        ORDER BY timestart, eid
+        LIMIT $4
+    """,
+    'server_events_before': """
+        SELECT eid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz FROM event
+        WHERE gid = $1 AND (timestart, eid) < ($2, $3)
+        ORDER BY timestart DESC, eid DESC
+        LIMIT $4
+    """,
+    'server_events_count': "SELECT count(*) FROM event WHERE gid = $1",
+    # private events plus the current server's events the user signed up for
+    'user_events_after': """
+        SELECT eid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz FROM (
+            SELECT eid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz
+            FROM event WHERE uiud = $1 AND gid IS NULL
+            UNION ALL
+            SELECT e.eid, e.meetingname, e.location, e.timestart, e.timeend, e.recurrence, e.recur_until, e.recur_tz
+            FROM event e
+            INNER JOIN scheduled s ON e.eid = s.eid
+            WHERE e.gid = $2 AND s.uiud = $1
+        ) events
+        WHERE (timestart, eid) > ($3, $4)
+        ORDER BY timestart, eid
+        LIMIT $5
+    """,
+    'user_events_before': """
+        SELECT eid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz FROM (
+            SELECT eid, meetingname, location, timestart, timeend, recurrence, recur_until, recur_tz
+            FROM event WHERE uiud = $1 AND gid IS NULL
+            UNION ALL
+            SELECT e.eid, e.meetingname, e.location, e.timestart, e.timeend, e.recurrence, e.recur_until, e.recur_tz
+            FROM event e
+            INNER JOIN scheduled s ON e.eid = s.eid
+            WHERE e.gid = $2 AND s.uiud = $1
+        ) events
+        WHERE (timestart, eid) < ($3, $4)
+        ORDER BY timestart DESC, eid DESC
+        LIMIT $5
+    """,
+    'user_events_count': """
+        SELECT (SELECT count(*) FROM event WHERE uiud = $1 AND gid IS NULL)
+             + (SELECT count(*) FROM event e INNER JOIN scheduled s ON e.eid = s.eid WHERE e.gid = $2 AND s.uiud = $1)
+    """,
+
+    # events the given users are signed up for (owners always are) that overlap [$2, $3), plus
+    # recurring ones whose later occurrences might; callers expand those with recurrence.overlapping
+    'busy_events': """
+        SELECT DISTINCT e.eid, e.meetingname, e.timestart, e.timeend, e.recurrence, e.recur_until, e.recur_tz
+        FROM event e
+        INNER JOIN scheduled s ON e.eid = s.eid
+        WHERE s.uiud = ANY($1::text[])
+        AND (tsrange(e.timestart, greatest(e.timeend, e.timestart)) && tsrange($2, $3)
+             OR (e.recurrence IS NOT NULL AND e.timestart < $3 AND (e.recur_until IS NULL OR e.recur_until >= $2)))
+    """,
+
+    # event-ID autocomplete, loaded once per scope by EventIndex
+    'guild_event_names': "SELECT eid, meetingname, uiud FROM event WHERE gid = $1",
+    'user_event_names': """
+        SELECT e.eid, e.meetingname, e.uiud FROM scheduled s INNER JOIN event e ON e.eid = s.eid WHERE s.uiud = $1
+    """,
+
+    # .ics export and calendar feeds, streamed through a cursor
+    'export_server_events': """
+        SELECT eid, meetingname, location, timestart, timeend FROM event
+        WHERE gid = $1
+        ORDER BY timestart, eid
+    """,
+    # private events plus server events the user signed up for, in every server
+    'export_user_events': """
+        SELECT eid, meetingname, location, timestart, timeend FROM (
+            SELECT eid, meetingname, location, timestart, timeend FROM event WHERE uiud = $1 AND gid IS NULL
+            UNION ALL
+            SELECT e.eid, e.meetingname, e.location, e.timestart, e.timeend
+            FROM event e
+            INNER JOIN scheduled s ON e.eid = s.eid
+            WHERE s.uiud = $1 AND e.gid IS NOT NULL
+        ) events
+        ORDER BY timestart, eid
+    """,
+    # digest of every exported (eid, updated_at), so it changes whenever an event is added,
+    # updated or deleted, or a sign-up is added or cancelled
+    'server_events_version': """
+        SELECT md5(coalesce(string_agg(eid::text || ':' || updated_at::text, ',' ORDER BY eid), ''))
+        FROM event WHERE gid = $1
+    """,
+    'user_events_version': """
+        SELECT md5(coalesce(string_agg(eid::text || ':' || updated_at::text, ',' ORDER BY eid), '')) FROM (
+            SELECT eid, updated_at FROM event WHERE uiud = $1 AND gid IS NULL
+            UNION ALL
+            SELECT e.eid, e.updated_at
+            FROM event e
+            INNER JOIN scheduled s ON e.eid = s.eid
+            WHERE s.uiud = $1 AND e.gid IS NOT NULL
+        ) events
+    """,
+}
+
+# env var -> (asyncpg.create_pool argument, type), unset ones keep asyncpg's defaults
+POOL_SETTINGS = {
+    'DB_POOL_MIN_SIZE': ('min_size', int),
+    'DB_POOL_MAX_SIZE': ('max_size', int),
+    'DB_STATEMENT_CACHE_SIZE': ('statement_cache_size', int),
+    'DB_COMMAND_TIMEOUT': ('command_timeout', float),
+    'DB_MAX_INACTIVE_CONNECTION_LIFETIME': ('max_inactive_connection_lifetime', float),
+}
+
+
+def pool_settings():
+    settings = {}
+    for env, (name, cast) in POOL_SETTINGS.items():
+        value = os.getenv(env)
+        if value:
+            settings[name] = cast(value)
+    return settings
+
+
+async def create_pool(**connect_kwargs):
+    return await asyncpg.create_pool(**connect_kwargs, **pool_settings())
+
+
+# Runs the named queries above on the pool (or a connection the caller holds), records how long
+# each one takes and owns the operations that need several statements in one transaction
+class Repository:
+    def __init__(self, pool, slow_query_ms=None):
+        self.pool = pool
+        # queries slower than this are printed as they happen
+        self.slow_query_ms = slow_query_ms if slow_query_ms is not None else float(os.getenv("DB_SLOW_QUERY_MS", "250"))
+        # name -> [calls, total seconds, slowest seconds]
+        self.latency = {}
+
+    async def _run(self, method, name, args, conn):
+        if conn is None:
+            async with self.pool.acquire() as conn:
+                return await self._run(method, name, args, conn)
+
+        started = time.perf_counter()
+        try:
+            return await getattr(conn, method)(QUERIES[name], *args)
+        finally:
+            self._record(name, time.perf_counter() - started)
+
+    def _record(self, name, elapsed):
+        stats = self.latency.get(name)
+        if stats is None:
+            stats = self.latency[name] = [0, 0.0, 0.0]
+        stats[0] += 1
+        stats[1] += elapsed
+        stats[2] = max(stats[2], elapsed)
+        if elapsed * 1000 >= self.slow_query_ms:
+            print(f"Slow query {name}: {elapsed * 1000:.1f} ms")
+
+    async def fetch(self, name, *args, conn=None):
+        return await self._run('fetch', name, args, conn)
+
+    async def fetchrow(self, name, *args, conn=None):
+        return await self._run('fetchrow', name, args, conn)
+
+    async def fetchval(self, name, *args, conn=None):
+        return await self._run('fetchval', name, args, conn)
+
+    async def execute(self, name, *args, conn=None):
+        return await self._run('execute', name, args, conn)
+
+    async def executemany(self, name, args, conn=None):
+        return await self._run('executemany', name, (args,), conn)
+
+    # Streams a query's rows from a server-side cursor, prefetch rows at a time
+    async def cursor(self, name, *args, prefetch=500):
+        started = time.perf_counter()
+        async with self.transaction() as conn:
+            async for row in conn.cursor(QUERIES[name], *args, prefetch=prefetch):
+                yield row
+        self._record(name, time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield conn
+
+    # name -> calls, average and slowest time in ms, busiest queries first
+    def stats(self):
+        return {
+            name: {'calls': calls, 'avg_ms': total / calls * 1000, 'max_ms': slowest * 1000}
+            for name, (calls, total, slowest) in sorted(self.latency.items(), key=lambda item: -item[1][1])
+        }
+
+    # Creates an event with its creator signed up, queueing the creator's role in role_gid
+    # (if any) in the same transaction. Returns the new eid.
+    # recurrence is (rule, until, timezone) for a repeating event
+    async def create_event(self, uiud, user_name, gid, name, location, start, end, role_gid=None, user_id=None,
+                           recurrence=(None, None, None)):
+        async with self.transaction() as conn:
+            await self.execute('ensure_user', uiud, user_name, conn=conn)
+            eid = await self.fetchval('insert_event', uiud, gid, name, location, start, end, *recurrence, conn=conn)
+            await self.execute('insert_signup', uiud, eid, 0, conn=conn)
+            if role_gid:
+                await enqueue(conn, 'assign_role', {'gid': role_gid, 'eid': eid, 'user_id': user_id})
+        return eid
+
+    async def update_event(self, eid, uiud, name=None, location=None, start=None, end=None):
+        return await self.execute('update_event', eid, uiud, name, location, start, end)
+
+    async def delete_event(self, eid, gid):
+        async with self.transaction() as conn:
+            await self.execute('delete_event_signups', eid, conn=conn)
+            role_id = await self.fetchval('delete_event', eid, conn=conn)
+            if gid:
+                await enqueue(conn, 'delete_role', {
+                    'gid': gid, 'eid': eid, 'role_id': role_id, 'reason': f"Event {eid} deleted"
+                }, f"delete_role:{eid}")
+
+    # Signs a user up, False if they already were
+    async def add_signup(self, uiud, user_name, eid, notification, role_gid=None, user_id=None):
+        async with self.transaction() as conn:
+            await self.execute('ensure_user', uiud, user_name, conn=conn)
+            added = await self.fetchval('insert_signup', uiud, eid, notification, conn=conn)
+            if added and role_gid:
+                await enqueue(conn, 'assign_role', {'gid': role_gid, 'eid': eid, 'user_id': user_id})
+        return bool(added)
+
+    # Imports events for one creator in a single transaction: one INSERT for the events, COPY for
+    # the creator's signups and one batched outbox write for their roles. Returns the new eids.
+    async def import_events(self, uiud, user_name, gid, events, role_gid=None, user_id=None):
+        async with self.transaction() as conn:
+            await self.execute('ensure_user', uiud, user_name, conn=conn)
+            rows = await self.fetch('insert_events', uiud, gid,
+                                    [event.name for event in events], [event.location for event in events],
+                                    [event.start for event in events], [event.end for event in events], conn=conn)
+            eids = [row['eid'] for row in rows]
+
+            started = time.perf_counter()
+            await conn.copy_records_to_table(
+                'scheduled', records=[(uiud, eid, 'Yes', 0) for eid in eids],
+                columns=['uiud', 'eid', 'status', 'notification'])
+            self._record('copy_signups', time.perf_counter() - started)
+
+            if role_gid:
+                await enqueue_many(conn, 'assign_role', [
+                    ({'gid': role_gid, 'eid': eid, 'user_id': user_id}, None) for eid in eids
+                ])
+        return eids
+
+    # Removes a signup, False if there was none
+    async def remove_signup(self, uiud, eid, role_gid=None):
+        async with self.transaction() as conn:
+            removed = await self.fetchval('delete_signup', uiud, eid, conn=conn)
+            if removed and role_gid:
+                await enqueue(conn, 'remove_role', {'gid': role_gid, 'eid': eid, 'user_id': int(uiud)})
+        return bool(removed)
+
+    # In one transaction, for the ended events in the given partitions: recurring ones with
+    # occurrences left move on to the next one with their signups reset to pending, the rest are
+    # deleted with their signups and get their role deletions queued. Returns the (deleted,
+    # advanced) event rows.
+    async def delete_ended_events(self, now, grace, partition_args):
+        async with self.transaction() as conn:
+            locked = await self.fetch('lock_ended_events', now, now - grace, *partition_args, conn=conn)
+            ended, advanced, occurrences = [], [], []
+            for event in locked:
+                occurrence = next_occurrence(event, now) if event['recurrence'] else None
+                if occurrence:
+                    advanced.append(event)
+                    occurrences.append(occurrence)
+                else:
+                    ended.append(event)
+            if advanced:
+                eids = [event['eid'] for event in advanced]
+                await self.execute('advance_events', eids, [start for start, _ in occurrences],
+                                   [end for _, end in occurrences], conn=conn)
+                await self.execute('reset_signups_of_events', eids, conn=conn)
+            eids = [event['eid'] for event in ended]
+            if eids:
+                await self.execute('delete_signups_of_events', eids, conn=conn)
+                await self.execute('delete_events', eids, conn=conn)
+                await enqueue_many(conn, 'delete_role', [
+                    ({'gid': event['gid'], 'eid': event['eid'], 'role_id': event['role_id'],
+                      'reason': f"Event {event['eid']} has ended."}, f"delete_role:{event['eid']}")
+                    for event in ended if event['gid']
+                ])
+        return ended, advanced
@@ -0,0 +1,64 @@
+import re
+
+ROLE_NAME_PATTERN = re.compile(r"^Event (\d+)$")
+
+
+def role_name(eid):
+    return f"Event {eid}"
+
+
+def parse_role_name(name):
+    match = ROLE_NAME_PATTERN.match(name)
+    return int(match.group(1)) if match else None
+
+
+# {guild_id: {eid: role_id}} kept current from gateway role events, so finding an
+# event's role is a dict lookup instead of a scan over guild.roles
+class RoleIndex:
+    def __init__(self):
+        self._roles = {}
+        self._events = {}
+
+    def add(self, guild_id, eid, role_id):
+        self._roles.setdefault(guild_id, {})[eid] = role_id
+        self._events[role_id] = (guild_id, eid)
+
+    def remove_role(self, role_id):
+        guild_id, eid = self._events.pop(role_id, (None, None))
+        roles = self._roles.get(guild_id)
+        if roles and roles.get(eid) == role_id:
+            del roles[eid]
+
+    def get(self, guild, eid):
+        role_id = self._roles.get(guild.id, {}).get(eid)
+        return guild.get_role(role_id) if role_id else None
+
+    # Returns the (role_id, eid, gid) links that were only known by role name, so the
+    # caller can persist them
+    def build(self, guilds, stored):
+        self._roles = {}
+        self._events = {}
+        for row in stored:
+            self.add(row['gid'], row['eid'], row['role_id'])
+
+        found = []
+        for guild in guilds:
+            for role in guild.roles:
+                eid = parse_role_name(role.name)
+                if eid is not None and eid not in self._roles.get(guild.id, {}):
+                    self.add(guild.id, eid, role.id)
+                    found.append((role.id, eid, guild.id))
+        return found
+
+    def on_role_create(self, role):
+        eid = parse_role_name(role.name)
+        if eid is not None and eid not in self._roles.get(role.guild.id, {}):
+            self.add(role.guild.id, eid, role.id)
+
+    def on_role_update(self, before, after):
+        # a role that is already linked stays linked when renamed
+        if after.id not in self._events:
+            self.on_role_create(after)
+
+    def on_role_delete(self, role):
+        self.remove_role(role.id)
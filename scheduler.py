@@ -0,0 +1,272 @@
+import asyncio
+import heapq
+from datetime import datetime, timedelta
+
+# scheduled.notification states
+PENDING = 0
+SENT = 1
+CLAIMED = 2
+# a claim only counts as stale once strictly older than the lease
+RETRY_SLACK = timedelta(seconds=1)
+
+
+# Atomically moves a batch of due rows to CLAIMED and returns them. Claims older than
+# stale_before belong to a worker that died mid-send and are taken over.
+async def claim_due(conn, now, stale_before, limit, partition):
+    return await conn.fetch(
+        """
+        WITH due AS (
+            SELECT s.uiud, s.eid
+            FROM scheduled s
+            INNER JOIN event e ON s.eid = e.eid
+            WHERE e.timestart <= $1
+            AND (s.notification = 0 OR (s.notification = 2 AND s.claimed_at < $2))
+            AND event_partition(e.gid, e.uiud, $4) = ANY($5::int[])
+            ORDER BY e.timestart
+            LIMIT $3
+            FOR UPDATE OF s SKIP LOCKED
+        )
+        UPDATE scheduled s
+        SET notification = 2, claimed_at = $1
+        FROM due, event e
+        WHERE s.uiud = due.uiud AND s.eid = due.eid AND e.eid = s.eid
+        RETURNING s.uiud, s.eid, e.meetingname, e.timestart, e.timeend, e.gid
+        """,
+        now, stale_before, limit, *partition.sql_args()
+    )
+
+
+async def confirm_sent(conn, rows):
+    if not rows:
+        return
+    await conn.execute(
+        """
+        UPDATE scheduled s
+        SET notification = 1, claimed_at = NULL
+        FROM unnest($1::int[], $2::text[]) AS d(eid, uiud)
+        WHERE s.eid = d.eid AND s.uiud = d.uiud AND s.notification = 2
+        """,
+        [row['eid'] for row in rows], [row['uiud'] for row in rows]
+    )
+
+
+# Keeps the next horizon of pending reminders in a heap and sleeps until the earliest one
+class ReminderScheduler:
+    def __init__(self, pool, dispatch, partition, horizon=timedelta(minutes=30), retry_delay=60,
+                 claim_lease=timedelta(minutes=5), batch_size=500):
+        self.pool = pool
+        self.partition = partition
+        # async callable that receives a batch of claimed rows and returns the ones it delivered
+        self.dispatch = dispatch
+        self.horizon = horizon
+        self.retry_delay = retry_delay
+        self.claim_lease = claim_lease
+        self.batch_size = batch_size
+
+        self._heap = []
+        self._pending = {}
+        # (claimed_at + claim_lease, eid, uiud) for claims that weren't confirmed, survives refills
+        self._retries = []
+        self._loaded_until = None
+        # changes that arrive mid-refill are replayed on top of the fresh snapshot
+        self._buffered = None
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    def reload(self):
+        # Forces a horizon refill on the next wakeup, used when the change feed may have missed writes
+        self._loaded_until = None
+        self._wakeup.set()
+
+    def discard(self, eid, uiud=None):
+        if uiud is None:
+            self._pending.pop(eid, None)
+            return
+        rows = self._pending.get(eid)
+        if rows:
+            rows.pop(uiud, None)
+            if not rows:
+                del self._pending[eid]
+
+    # Change feed subscriber: keeps the loaded horizon in step with event/scheduled writes
+    def apply(self, change):
+        if self._buffered is not None:
+            self._buffered.append(change)
+            return
+        if self._loaded_until is None:
+            return
+
+        eid = change['eid']
+        if change['op'] != 'DELETE' and not self.partition.owns(change['gid'], change['owner']):
+            # another process owns this event
+            return
+        if change['op'] == 'DELETE':
+            self.discard(eid, change.get('uiud') if change['table'] == 'scheduled' else None)
+        elif change['table'] == 'scheduled':
+            if change['notification'] == PENDING and change['timestart'] and change['timestart'] < self._loaded_until:
+                self._push(change)
+            else:
+                self.discard(eid, change['uiud'])
+        elif change['op'] == 'UPDATE':
+            rows = self._pending.pop(eid, {})
+            if change['timestart'] < self._loaded_until:
+                if rows:
+                    for row in rows.values():
+                        self._push({**row, **{key: change[key] for key in ('meetingname', 'timestart', 'timeend')}})
+                elif change['old_timestart'] is None or change['old_timestart'] >= self._loaded_until:
+                    # moved into the horizon, so its subscribers were never loaded
+                    asyncio.create_task(self._load_event(eid))
+        else:
+            return
+
+        self._wakeup.set()
+
+    async def _load_event(self, eid):
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT s.uiud, s.eid, e.meetingname, e.timestart, e.timeend, e.gid
+                    FROM scheduled s
+                    INNER JOIN event e ON s.eid = e.eid
+                    WHERE s.eid = $1
+                    AND s.notification = 0
+                    AND event_partition(e.gid, e.uiud, $2) = ANY($3::int[])
+                    """,
+                    eid, *self.partition.sql_args()
+                )
+        except Exception as e:
+            print(f"Error loading reminders for event {eid}: {e}")
+            return
+
+        for row in rows:
+            if self._loaded_until and row['timestart'] < self._loaded_until:
+                self._push(row)
+        self._wakeup.set()
+
+    async def _refill(self, now):
+        until = now + self.horizon
+        self._buffered = []
+        try:
+            async with self.pool.acquire() as conn:
+                rows = await conn.fetch(
+                    """
+                    SELECT s.uiud, s.eid, e.meetingname, e.timestart, e.timeend, e.gid
+                    FROM scheduled s
+                    INNER JOIN event e ON s.eid = e.eid
+                    WHERE e.timestart < $1
+                    AND (s.notification = 0 OR (s.notification = 2 AND s.claimed_at < $2))
+                    AND event_partition(e.gid, e.uiud, $3) = ANY($4::int[])
+                    """,
+                    until, now - self.claim_lease, *self.partition.sql_args()
+                )
+        except Exception:
+            self._buffered = None
+            raise
+
+        self._heap = []
+        self._pending = {}
+        for row in rows:
+            self._push(row)
+        self._loaded_until = until
+
+        buffered, self._buffered = self._buffered, None
+        for change in buffered:
+            self.apply(change)
+
+    def _push(self, row):
+        row = {key: row[key] for key in ('uiud', 'eid', 'meetingname', 'timestart', 'timeend', 'gid')}
+        self._pending.setdefault(row['eid'], {})[row['uiud']] = row
+        heapq.heappush(self._heap, (row['timestart'], row['eid'], row['uiud']))
+
+    def _pop_due(self, now):
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            timestart, eid, uiud = heapq.heappop(self._heap)
+            rows = self._pending.get(eid)
+            # entries for discarded or rescheduled events are dropped lazily
+            if not rows or uiud not in rows or rows[uiud]['timestart'] != timestart:
+                continue
+            due.append(rows.pop(uiud))
+            if not rows:
+                del self._pending[eid]
+        return due
+
+    def _pop_retries(self, now):
+        due = False
+        while self._retries and self._retries[0][0] <= now:
+            heapq.heappop(self._retries)
+            due = True
+        return due
+
+    async def _deliver(self):
+        # The heap only decides when to wake up; the DB claim decides who sends what,
+        # so several bot processes can share the same rows.
+        while True:
+            now = datetime.utcnow()
+            async with self.pool.acquire() as conn:
+                claimed = await claim_due(conn, now, now - self.claim_lease, self.batch_size, self.partition)
+            if not claimed:
+                return
+
+            confirmed = set()
+            try:
+                sent = await self.dispatch(claimed)
+                async with self.pool.acquire() as conn:
+                    await confirm_sent(conn, sent)
+                confirmed = {(row['eid'], row['uiud']) for row in sent}
+            finally:
+                # the rest stay CLAIMED until their lease runs out, wake up then to take them over
+                for row in claimed:
+                    if (row['eid'], row['uiud']) not in confirmed:
+                        heapq.heappush(self._retries, (now + self.claim_lease + RETRY_SLACK, row['eid'], row['uiud']))
+
+            if len(claimed) < self.batch_size:
+                return
+
+    def _next_deadline(self):
+        deadline = self._loaded_until
+        if self._heap:
+            deadline = min(self._heap[0][0], deadline)
+        if self._retries:
+            deadline = min(self._retries[0][0], deadline)
+        return deadline
+
+    async def _run(self):
+        while True:
+            now = datetime.utcnow()
+            if self._loaded_until is None or now >= self._loaded_until:
+                try:
+                    await self._refill(now)
+                except Exception as e:
+                    print(f"Error loading reminders: {e}")
+                    self._loaded_until = None
+                    await asyncio.sleep(self.retry_delay)
+                    continue
+
+            # both are drained before deciding, expired retries must not stay at the head
+            due = self._pop_due(now)
+            retry = self._pop_retries(now)
+            if due or retry:
+                try:
+                    await self._deliver()
+                except Exception as e:
+                    # unconfirmed claims expire and are picked up again once their retry is due
+                    print(f"Error sending reminders: {e}")
+                continue
+
+            self._wakeup.clear()
+            delay = (self._next_deadline() - datetime.utcnow()).total_seconds()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(delay, 0))
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,109 @@
+import asyncio
+import os
+import asyncpg
+
+# first key of the two-key advisory locks, the second key is the shard id
+PARTITION_LOCK = 0x73686172
+
+
+# Which reminder/cleanup partitions this process works. A partition is a shard id: guild events
+# belong to their guild's shard, private events are spread over the same ids by creator.
+# `owned` only holds the shards whose advisory lock this process actually has.
+class Partition:
+    def __init__(self, shard_count=1, shard_ids=None):
+        self.shard_count = shard_count
+        self.shard_ids = list(shard_ids) if shard_ids is not None else list(range(shard_count))
+        self.owned = set(self.shard_ids) if shard_count == 1 else set()
+
+    @classmethod
+    def from_env(cls):
+        # SHARD_COUNT: total shards across every process, SHARD_IDS: comma separated ids run here
+        shard_count = os.getenv("SHARD_COUNT")
+        if not shard_count:
+            return cls()
+        shard_ids = os.getenv("SHARD_IDS")
+        return cls(int(shard_count), [int(x) for x in shard_ids.split(',')] if shard_ids else None)
+
+    @property
+    def sharded(self):
+        return self.shard_count > 1
+
+    def partition_of(self, gid, uiud):
+        # same formula as the event_partition() SQL function
+        if gid is not None:
+            return (int(gid) >> 22) % self.shard_count
+        return (int(uiud) >> 22) % self.shard_count
+
+    def owns(self, gid, uiud):
+        if gid is None and uiud is None:
+            return False
+        return self.partition_of(gid, uiud) in self.owned
+
+    # Positional SQL arguments for `event_partition(gid, uiud, $n) = ANY($n+1::int[])`
+    def sql_args(self):
+        return self.shard_count, sorted(self.owned)
+
+
+# Holds one advisory lock per shard on a dedicated connection, so two processes configured with
+# overlapping SHARD_IDS never work the same partition. Locks go away with the connection, so on
+# disconnect ownership is dropped and re-acquired.
+class PartitionLocks:
+    def __init__(self, partition, connect_kwargs, retry_delay=15, on_acquired=None):
+        self.partition = partition
+        self.connect_kwargs = connect_kwargs
+        self.retry_delay = retry_delay
+        # called when shards are picked up after startup, so their rows can be loaded
+        self.on_acquired = on_acquired
+        self._conn = None
+        self._task = None
+        self._closing = False
+
+    async def acquire(self):
+        if not self.partition.sharded:
+            return
+        self._conn = await asyncpg.connect(**self.connect_kwargs)
+        self._conn.add_termination_listener(self._on_terminate)
+        await self._try_lock()
+        if set(self.partition.shard_ids) - self.partition.owned:
+            self._start_retrying()
+
+    async def _try_lock(self):
+        for shard_id in self.partition.shard_ids:
+            if shard_id in self.partition.owned:
+                continue
+            if await self._conn.fetchval("SELECT pg_try_advisory_lock($1, $2)", PARTITION_LOCK, shard_id):
+                self.partition.owned.add(shard_id)
+            else:
+                print(f"Shard {shard_id} is locked by another process, not running its reminders or cleanup.")
+
+    def _start_retrying(self):
+        if not self._closing and (self._task is None or self._task.done()):
+            self._task = asyncio.create_task(self._retry())
+
+    async def _retry(self):
+        while not self._closing and set(self.partition.shard_ids) - self.partition.owned:
+            await asyncio.sleep(self.retry_delay)
+            try:
+                if self._conn is None or self._conn.is_closed():
+                    self._conn = await asyncpg.connect(**self.connect_kwargs)
+                    self._conn.add_termination_listener(self._on_terminate)
+                before = set(self.partition.owned)
+                await self._try_lock()
+                if self.partition.owned - before and self.on_acquired:
+                    self.on_acquired()
+            except Exception as e:
+                print(f"Error acquiring partition locks: {e}")
+
+    def _on_terminate(self, conn):
+        # the server released our locks with the session
+        self.partition.owned.clear()
+        self._conn = None
+        self._start_retrying()
+
+    async def close(self):
+        self._closing = True
+        if self._task:
+            self._task.cancel()
+        if self._conn and not self._conn.is_closed():
+            await self._conn.close()
+        self.partition.owned.clear()
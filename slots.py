@@ -0,0 +1,65 @@
+import bisect
+from datetime import datetime, timedelta
+from recurrence import overlapping
+from tz_convert import converter
+
+
+# Sorted, non-overlapping (start, end) intervals covering everything in busy
+def merge(busy):
+    merged = []
+    for start, end in sorted(busy):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def busy_intervals(rows, start, end):
+    busy = []
+    for row in rows:
+        busy.extend(overlapping(row, start, end))
+    return merge(busy)
+
+
+# Yields the parts of [start, end) not covered by the merged intervals in busy. ends holds
+# each interval's end, sorted like busy since merged intervals don't overlap.
+def gaps(busy, ends, start, end):
+    cursor = start
+    for busy_start, busy_end in busy[bisect.bisect_right(ends, start):]:
+        if busy_start >= end:
+            break
+        if busy_start > cursor:
+            yield cursor, busy_start
+        cursor = max(cursor, busy_end)
+    if cursor < end:
+        yield cursor, end
+
+
+# Local first_day 00:00 to the end of last_day, as naive UTC
+def search_range(first_day, last_day, tz_name):
+    return (converter.to_utc(datetime.combine(first_day, datetime.min.time()), tz_name),
+            converter.to_utc(datetime.combine(last_day + timedelta(days=1), datetime.min.time()), tz_name))
+
+
+# Free windows of at least duration between first_day and last_day, only between from_hour
+# and to_hour on tz_name's wall clock. Days and hours are local, everything returned is naive UTC.
+def free_windows(rows, first_day, last_day, duration, tz_name, from_hour=9, to_hour=21, limit=10):
+    range_start, range_end = search_range(first_day, last_day, tz_name)
+    busy = busy_intervals(rows, range_start, range_end)
+    ends = [busy_end for _, busy_end in busy]
+
+    windows = []
+    day = first_day
+    while day <= last_day and len(windows) < limit:
+        midnight = datetime.combine(day, datetime.min.time())
+        day_start = converter.to_utc(midnight + timedelta(hours=from_hour), tz_name)
+        day_end = converter.to_utc(midnight + timedelta(hours=to_hour), tz_name)
+        for start, end in gaps(busy, ends, day_start, day_end):
+            if end - start >= duration:
+                windows.append((start, end))
+                if len(windows) == limit:
+                    break
+        day += timedelta(days=1)
+    return windows
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import contextmanager
+
+# where the fingerprint of the last synced command tree is kept, per application id
+COMMAND_HASH_FILE = os.getenv("COMMAND_HASH_FILE", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '.command_tree_hash'))
+
+
+# Times named startup phases and prints them as one line
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def report(self):
+        total = time.perf_counter() - self.started
+        phases = ', '.join(f"{name} {elapsed * 1000:.0f} ms" for name, elapsed in self.phases)
+        print(f"Startup took {total:.2f}s: {phases}")
+
+
+def command_fingerprint(tree):
+    payload = sorted((command.to_dict() for command in tree.get_commands()), key=lambda command: command['name'])
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _read_hashes(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+# Syncs the global command tree only when its signatures changed since the last sync from this
+# machine. Returns the number of synced commands, or None when the sync was skipped.
+async def sync_commands(tree, application_id, path=COMMAND_HASH_FILE):
+    fingerprint = command_fingerprint(tree)
+    hashes = _read_hashes(path)
+    if hashes.get(str(application_id)) == fingerprint:
+        return None
+
+    synced = await tree.sync()
+    hashes[str(application_id)] = fingerprint
+    try:
+        with open(path, 'w') as f:
+            json.dump(hashes, f)
+    except OSError as e:
+        print(f"Could not save the command tree fingerprint: {e}")
+    return len(synced)
@@ -0,0 +1,90 @@
+from datetime import datetime
+
+import pytest
+
+import importer
+
+
+def ics(*events):
+    body = "".join(f"BEGIN:VEVENT\r\n{event}END:VEVENT\r\n" for event in events)
+    return f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\n{body}END:VCALENDAR\r\n".encode()
+
+
+NOW = datetime(2026, 1, 1)
+
+
+def test_unfold_joins_continuation_lines():
+    lines = ["SUMMARY:Weekly\r\n", " standup\r\n", "\tmeeting\r\n", "LOCATION:Room 1\r\n"]
+    assert list(importer.unfold(lines)) == [(1, "SUMMARY:Weeklystandupmeeting"), (4, "LOCATION:Room 1")]
+
+
+def test_unescape():
+    assert importer.unescape(r"Lunch\, then talks\; bring a laptop\nRoom \\ 2") == \
+        "Lunch, then talks; bring a laptop\nRoom \\ 2"
+
+
+def test_ics_utc_tzid_and_floating_times():
+    data = ics(
+        "SUMMARY:utc\r\nDTSTART:20260301T150000Z\r\nDTEND:20260301T160000Z\r\n",
+        "SUMMARY:tzid\r\nDTSTART;TZID=America/New_York:20260301T100000\r\nDTEND;TZID=America/New_York:20260301T110000\r\n",
+        "SUMMARY:floating\r\nDTSTART:20260301T100000\r\nDTEND:20260301T110000\r\n",
+    )
+    events, errors = importer.load_events("cal.ics", data, "Europe/Berlin", now=NOW)
+    assert errors == []
+    assert [(event.name, event.start, event.end) for event in events] == [
+        ("utc", datetime(2026, 3, 1, 15), datetime(2026, 3, 1, 16)),
+        ("tzid", datetime(2026, 3, 1, 15), datetime(2026, 3, 1, 16)),
+        # no zone given, read in the importing user's zone (UTC+1 in March)
+        ("floating", datetime(2026, 3, 1, 9), datetime(2026, 3, 1, 10)),
+    ]
+
+
+def test_ics_all_day_without_end_lasts_a_day():
+    events, errors = importer.load_events("cal.ics", ics("SUMMARY:holiday\r\nDTSTART;VALUE=DATE:20260301\r\n"), "UTC", now=NOW)
+    assert errors == []
+    assert (events[0].start, events[0].end) == (datetime(2026, 3, 1), datetime(2026, 3, 2))
+
+
+def test_ics_duration():
+    data = ics("SUMMARY:talk\r\nDTSTART:20260301T150000Z\r\nDURATION:PT1H30M\r\n")
+    events, errors = importer.load_events("cal.ics", data, "UTC", now=NOW)
+    assert errors == []
+    assert events[0].end == datetime(2026, 3, 1, 16, 30)
+
+
+def test_ics_row_errors():
+    data = ics(
+        "SUMMARY:no end\r\nDTSTART:20260301T150000Z\r\n",
+        "SUMMARY:bad zone\r\nDTSTART;TZID=Mars/Olympus:20260301T100000\r\nDTEND:20260301T110000Z\r\n",
+        "SUMMARY:past\r\nDTSTART:20250301T150000Z\r\nDTEND:20250301T160000Z\r\n",
+        f"SUMMARY:{'x' * (importer.MAX_NAME_LENGTH + 1)}\r\nDTSTART:20260301T150000Z\r\nDTEND:20260301T160000Z\r\n",
+    )
+    events, errors = importer.load_events("cal.ics", data, "UTC", now=NOW)
+    assert events == []
+    assert len(errors) == 4
+    assert "missing DTEND or DURATION" in errors[0]
+    assert "unknown TZID" in errors[1]
+    assert "already ended" in errors[2]
+    assert "longer than" in errors[3]
+
+
+def test_csv_rows():
+    data = (b"name,location,start_date,start_time,end_date,end_time\n"
+            b"Standup,Room 1,2026-03-01,10:00:00,2026-03-01,10:15:00\n"
+            b"Broken,,03/01/2026,10:00,2026-03-01,11:00:00\n")
+    events, errors = importer.load_events("events.csv", data, "UTC", now=NOW)
+    assert [(event.name, event.location, event.start) for event in events] == [
+        ("Standup", "Room 1", datetime(2026, 3, 1, 10))]
+    assert errors == ["line 3: dates must be YYYY-MM-DD and times HH:MM:SS"]
+
+
+def test_csv_missing_columns():
+    with pytest.raises(importer.ImportFormatError, match="start_time, end_date, end_time"):
+        importer.load_events("events.csv", b"name,location,start_date\n", "UTC", now=NOW)
+
+
+def test_rejects_other_extensions_and_oversized_files():
+    with pytest.raises(importer.ImportFormatError):
+        importer.load_events("events.txt", b"", "UTC", now=NOW)
+    with pytest.raises(importer.ImportFormatError):
+        importer.load_events("events.csv", b"x" * (importer.MAX_IMPORT_BYTES + 1), "UTC", now=NOW)
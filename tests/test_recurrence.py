@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import recurrence
+
+
+def series(rule, start, end, tz_name='UTC', until=None):
+    return {'recurrence': rule, 'recur_tz': tz_name, 'recur_until': until, 'timestart': start, 'timeend': end}
+
+
+def test_weekly_keeps_wall_clock_across_dst():
+    # 10:00-11:00 New York time, the Monday before DST ends (EDT, UTC-4)
+    row = series('weekly', datetime(2026, 10, 26, 14), datetime(2026, 10, 26, 15), 'America/New_York')
+    # after Nov 1st it's EST (UTC-5), so the same 10:00 is an hour later in UTC
+    assert recurrence.upcoming(row, 2) == [
+        (datetime(2026, 11, 2, 15), datetime(2026, 11, 2, 16)),
+        (datetime(2026, 11, 9, 15), datetime(2026, 11, 9, 16)),
+    ]
+
+
+def test_daily_keeps_wall_clock_across_dst_start():
+    # 09:00 New York time on the day before DST starts (EST, UTC-5)
+    row = series('daily', datetime(2026, 3, 7, 14), datetime(2026, 3, 7, 15), 'America/New_York')
+    assert recurrence.upcoming(row, 1) == [(datetime(2026, 3, 8, 13), datetime(2026, 3, 8, 14))]
+
+
+def test_monthly_skips_months_without_the_day():
+    row = series('monthly', datetime(2026, 1, 31, 9), datetime(2026, 1, 31, 10))
+    starts = [start for start, _ in recurrence.upcoming(row, 3)]
+    assert starts == [datetime(2026, 3, 31, 9), datetime(2026, 5, 31, 9), datetime(2026, 7, 31, 9)]
+
+
+def test_until_ends_the_series():
+    row = series('daily', datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10), until=datetime(2026, 1, 3, 23, 59, 59))
+    assert [start for start, _ in recurrence.following(row)] == [datetime(2026, 1, 2, 9), datetime(2026, 1, 3, 9)]
+
+
+def test_not_recurring_has_no_following():
+    row = series(None, datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10))
+    assert list(recurrence.following(row)) == []
+
+
+def test_next_occurrence_skips_missed_ones():
+    row = series('weekly', datetime(2026, 1, 5, 9), datetime(2026, 1, 5, 10))
+    assert recurrence.next_occurrence(row, datetime(2026, 1, 20)) == (datetime(2026, 1, 26, 9), datetime(2026, 1, 26, 10))
+    # an occurrence still running counts
+    assert recurrence.next_occurrence(row, datetime(2026, 1, 12, 9, 30)) == (datetime(2026, 1, 12, 9), datetime(2026, 1, 12, 10))
+
+
+def test_next_occurrence_none_once_over():
+    row = series('daily', datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10), until=datetime(2026, 1, 2, 12))
+    assert recurrence.next_occurrence(row, datetime(2026, 1, 2, 11)) is None
+
+
+def test_overlapping_includes_stored_and_later_occurrences():
+    row = series('daily', datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10))
+    assert recurrence.overlapping(row, datetime(2026, 1, 1, 9, 30), datetime(2026, 1, 3, 9)) == [
+        (datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10)),
+        (datetime(2026, 1, 2, 9), datetime(2026, 1, 2, 10)),
+    ]
+
+
+def test_overlapping_touching_is_not_overlap():
+    row = series(None, datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 10))
+    assert recurrence.overlapping(row, datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 11)) == []
@@ -0,0 +1,61 @@
+from datetime import date, datetime, timedelta
+
+import slots
+
+
+def event(start, end):
+    return {'timestart': start, 'timeend': end, 'recurrence': None, 'recur_until': None, 'recur_tz': 'UTC'}
+
+
+def test_merge_joins_overlapping_and_touching():
+    busy = [(datetime(2026, 1, 1, 11), datetime(2026, 1, 1, 13)), (datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 12)),
+            (datetime(2026, 1, 1, 13), datetime(2026, 1, 1, 14)), (datetime(2026, 1, 1, 16), datetime(2026, 1, 1, 17))]
+    assert slots.merge(busy) == [(datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 14)),
+                                 (datetime(2026, 1, 1, 16), datetime(2026, 1, 1, 17))]
+
+
+def test_merge_keeps_contained_interval_inside():
+    busy = [(datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 17)), (datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 11))]
+    assert slots.merge(busy) == [(datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 17))]
+
+
+def test_gaps_around_busy_intervals():
+    busy = [(datetime(2026, 1, 1, 8), datetime(2026, 1, 1, 10)), (datetime(2026, 1, 1, 12), datetime(2026, 1, 1, 13))]
+    ends = [end for _, end in busy]
+    assert list(slots.gaps(busy, ends, datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 15))) == [
+        (datetime(2026, 1, 1, 10), datetime(2026, 1, 1, 12)),
+        (datetime(2026, 1, 1, 13), datetime(2026, 1, 1, 15)),
+    ]
+
+
+def test_gaps_fully_busy():
+    busy = [(datetime(2026, 1, 1), datetime(2026, 1, 2))]
+    assert list(slots.gaps(busy, [datetime(2026, 1, 2)], datetime(2026, 1, 1, 9), datetime(2026, 1, 1, 17))) == []
+
+
+def test_free_windows_around_a_busy_interval():
+    rows = [event(datetime(2026, 1, 5, 11), datetime(2026, 1, 5, 13))]
+    windows = slots.free_windows(rows, date(2026, 1, 5), date(2026, 1, 5), timedelta(hours=1), 'UTC', 9, 17)
+    assert windows == [(datetime(2026, 1, 5, 9), datetime(2026, 1, 5, 11)),
+                       (datetime(2026, 1, 5, 13), datetime(2026, 1, 5, 17))]
+
+
+def test_free_windows_drops_gaps_shorter_than_duration():
+    rows = [event(datetime(2026, 1, 5, 9, 30), datetime(2026, 1, 5, 16))]
+    assert slots.free_windows(rows, date(2026, 1, 5), date(2026, 1, 5), timedelta(hours=1), 'UTC', 9, 17) == [
+        (datetime(2026, 1, 5, 16), datetime(2026, 1, 5, 17))]
+
+
+def test_free_windows_expand_recurring_events():
+    weekly = {**event(datetime(2025, 12, 29, 9), datetime(2025, 12, 29, 17)), 'recurrence': 'weekly'}
+    # the Monday is taken by the series, Tuesday is free
+    assert slots.free_windows([weekly], date(2026, 1, 5), date(2026, 1, 6), timedelta(hours=1), 'UTC', 9, 17) == [
+        (datetime(2026, 1, 6, 9), datetime(2026, 1, 6, 17))]
+
+
+def test_free_windows_use_local_hours_across_dst():
+    # Nov 1st 2026 is 25 hours long in New York; 09:00-21:00 EST is 14:00-02:00 UTC
+    windows = slots.free_windows([], date(2026, 11, 1), date(2026, 11, 1), timedelta(hours=1), 'America/New_York')
+    assert windows == [(datetime(2026, 11, 1, 14), datetime(2026, 11, 2, 2))]
+    assert slots.search_range(date(2026, 11, 1), date(2026, 11, 1), 'America/New_York') == (
+        datetime(2026, 11, 1, 4), datetime(2026, 11, 2, 5))
@@ -1,15 +1,73 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+import bisect
 import tzlocal
 import pytz
 
 
+# Caches zone objects and formats datetimes without going through strftime/strptime strings.
+# A shared instance backs the module-level helpers below.
+class TimeConverter:
+    def __init__(self):
+        self._zones = {}
+        self._local_zone = None
+
+    def zone(self, name):
+        tz = self._zones.get(name)
+        if tz is None:
+            tz = self._zones[name] = pytz.timezone(name)
+        return tz
+
+    def local_zone(self):
+        if self._local_zone is None:
+            self._local_zone = tzlocal.get_localzone()
+        return self._local_zone
+
+    # naive local wall time in tz_name -> naive UTC, the way event times are stored
+    def to_utc(self, local_datetime, tz_name):
+        return self.zone(tz_name).localize(local_datetime).astimezone(pytz.utc).replace(tzinfo=None)
+
+    # "YYYY-MM-DD", "HH:MM:SS" as typed by a user in tz_name -> naive UTC
+    def parse_local(self, date_str, time_str, tz_name):
+        return self.to_utc(datetime.strptime(f"{date_str} {time_str}", '%Y-%m-%d %H:%M:%S'), tz_name)
+
+    def from_utc(self, utc_datetime, tz_name):
+        return pytz.utc.localize(utc_datetime).astimezone(self.zone(tz_name))
+
+    @staticmethod
+    def format_time(time_obj):
+        period = "AM" if time_obj.hour < 12 else "PM"
+        hrs = time_obj.hour % 12 if time_obj.hour % 12 != 0 else 12
+        get_tz = time_obj.strftime('%Z')
+
+        return f"{hrs:01d}:{time_obj.minute:02d} {period} {get_tz}" if hrs > 10 else f"{hrs:02d}:{time_obj.minute:02d} {period} {get_tz}"
+
+    @staticmethod
+    def format_date(date):
+        return f"{date.month:02d}-{date.day:02d}-{date.year:04d}"
+
+    # Formats a page of rows in one pass: (start_date, start_time, end_date, end_time) per row,
+    # with dates and times both in tz_name. Event times are stored as naive UTC.
+    def convert_many(self, rows, tz_name):
+        tz = self.zone(tz_name)
+        converted = []
+        for row in rows:
+            start = pytz.utc.localize(row['timestart']).astimezone(tz)
+            end = pytz.utc.localize(row['timeend']).astimezone(tz)
+            converted.append((self.format_date(start), self.format_time(start),
+                              self.format_date(end), self.format_time(end)))
+        return converted
+
+
+converter = TimeConverter()
+
+
 def local_to_utc(user_time):
     # parse it into a datetime object
     if isinstance(user_time, str):
         user_time = datetime.strptime(user_time, '%H:%M:%S')
 
     # Get local time zone
-    local_tz = tzlocal.get_localzone()
+    local_tz = converter.local_zone()
     local_time = user_time.replace(tzinfo=local_tz)
 
     # Convert to UTC
@@ -22,7 +80,7 @@ def local_to_utc_date(local_datetime_str):
     local_datetime = datetime.strptime(local_datetime_str, '%Y-%m-%d %H:%M:%S')
 
     # Get local time zone
-    local_tz = tzlocal.get_localzone()
+    local_tz = converter.local_zone()
     local_datetime = local_datetime.replace(tzinfo=local_tz)
 
     # Convert to UTC
@@ -39,7 +97,7 @@ def utc_to_local(utc_time):
     utc_time = utc_time.replace(tzinfo=timezone.utc)
 
     # Get the local timezone
-    user_tz = tzlocal.get_localzone()
+    user_tz = converter.local_zone()
 
     # Convert to local timezone
     local_time = utc_time.astimezone(user_tz)
@@ -47,7 +105,7 @@ def utc_to_local(utc_time):
 
 
 def time_format_locale(time):
-    local_tz = tzlocal.get_localzone()
+    local_tz = converter.local_zone()
 
     if isinstance(time, str):
         hrs, mins, sec = map(int, time.split(':'))
@@ -67,13 +125,45 @@ def time_format_locale(time):
     return f"{hrs:01d}:{mins:02d}:{sec:02d} {period} {get_tz}" if hrs > 10 else f"{hrs:02d}:{mins:02d}:{sec:02d} {period} {get_tz}"
 
 
-def find_timezone(timestamp):
+US_TIMEZONES = [tz for tz in pytz.all_timezones if tz.startswith("US/")]
+
+# UTC offset (seconds) -> first US zone currently at that offset, valid until the next DST
+# transition in any of those zones
+_offset_table = {}
+_offset_table_valid_until = None
+
+
+def _next_transition(tz, now):
+    # pytz keeps each zone's transitions as naive UTC datetimes
+    transitions = getattr(tz, '_utc_transition_times', [])
+    i = bisect.bisect_right(transitions, now)
+    return transitions[i] if i < len(transitions) else None
+
+
+def _build_offset_table(now):
+    global _offset_table, _offset_table_valid_until
+
+    table = {}
+    valid_until = now + timedelta(days=366)
+    for name in US_TIMEZONES:
+        tz = converter.zone(name)
+        offset = tz.fromutc(now.replace(tzinfo=tz)).utcoffset().total_seconds()
+        table.setdefault(offset, name)
+        transition = _next_transition(tz, now)
+        if transition and transition < valid_until:
+            valid_until = transition
+
+    _offset_table = table
+    _offset_table_valid_until = valid_until
+
+
+def _find_timezone_scan(timestamp):
+    # original linear scan, kept as the reference for the benchmark below
     offset = timestamp.strftime('%z')
     offset_hrs = int(offset[0:3])
     offset_mins = int(offset[0] + offset[3:])
 
-    us_timezones = [tz for tz in pytz.all_timezones if tz.startswith("US/")]
-    for tz in us_timezones:
+    for tz in US_TIMEZONES:
         timezone = pytz.timezone(tz)
         current_time = datetime.now(timezone)
 
@@ -83,8 +173,19 @@ def find_timezone(timestamp):
     return None
 
 
+def find_timezone(timestamp):
+    now = datetime.utcnow()
+    if _offset_table_valid_until is None or now >= _offset_table_valid_until:
+        _build_offset_table(now)
+
+    offset = timestamp.utcoffset()
+    if offset is None:
+        offset = timestamp.astimezone().utcoffset()
+    return _offset_table.get(offset.total_seconds())
+
+
 def convert_locale(time, timezone_str):
-    timezone = pytz.timezone(timezone_str)
+    timezone = converter.zone(timezone_str)
 
     current_date = datetime.now().date()
 
@@ -97,12 +198,7 @@ def convert_locale(time, timezone_str):
         time_obj = time
 
     time_obj = time_obj.replace(tzinfo=pytz.utc).astimezone(timezone)
-
-    period = "AM" if time_obj.hour < 12 else "PM"
-    hrs = time_obj.hour % 12 if time_obj.hour % 12 != 0 else 12
-    get_tz = time_obj.strftime('%Z')
-
-    return f"{hrs:01d}:{time_obj.minute:02d} {period} {get_tz}" if hrs > 10 else f"{hrs:02d}:{time_obj.minute:02d} {period} {get_tz}"
+    return converter.format_time(time_obj)
 
 
 def date_format(date):
@@ -122,3 +218,17 @@ def date_format(date):
 def validate_time_input(start, end):
     current_utc = datetime.now(timezone.utc)
     return start < end and start > current_utc
+
+
+if __name__ == "__main__":
+    # microbenchmark: python tz_convert.py
+    import timeit
+
+    timestamp = datetime.now().astimezone()
+    assert find_timezone(timestamp) == _find_timezone_scan(timestamp)
+
+    runs = 200
+    scan = timeit.timeit(lambda: _find_timezone_scan(timestamp), number=runs) / runs
+    table = timeit.timeit(lambda: find_timezone(timestamp), number=runs * 100) / (runs * 100)
+    print(f"linear scan:  {scan * 1e6:10.2f} us/call")
+    print(f"offset table: {table * 1e6:10.2f} us/call ({scan / table:.0f}x faster)")